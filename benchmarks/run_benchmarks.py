@@ -0,0 +1,207 @@
+"""Benchmarks of the Urban Landscape Generator.
+
+Times layout generation for all orders over domain sizes and build-up densities,
+and heights, greenery, statistics, block files and plots on the generated layouts,
+all with fixed seeds. Each benchmark reports its time and peak memory against the
+number of blocks. Results are saved as JSON and can be compared to a baseline:
+
+    python3 benchmarks/run_benchmarks.py --output results.json
+    python3 benchmarks/run_benchmarks.py --baseline results.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import timeit
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+PROJ_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJ_DIR))
+import citygenerator
+from citygenerator import heights, greenery, utils, plot
+
+
+SEED = 1
+ORDERS = ["random", "hierarchical", "cascade"]
+SIZES = {"quick": [250, 500, 1000], "full": [250, 500, 1000, 2000, 4000]}
+PBUILDS = {"quick": [0.4], "full": [0.2, 0.4]}
+PLOTSIZES = [250, 500, 1000]  # plots get slow for large layouts
+
+
+def layout_params(size, pbuild, order="random"):
+    # square domain at 1 m resolution with the parameters of the examples
+    return dict(xsize=size, ysize=size, zsize=300, imax=size, jtot=size, kmax=300,
+                pbuild=pbuild, pgreen=0.05, pfrontal=0.2, order=order,
+                layoutrandom=0.5, heightrandom=0.5, margin=5, minwidth=8, minvolume=10)
+
+
+# MEASUREMENTS
+# -----------
+
+def measure(function, repeat=3):
+    """Returns the time per call of a function, the shortest of repeat timings, and
+    the peak memory of one call, which is traced separately as tracing slows down
+    the call. Fast functions are called as often as needed to run for 0.2 s per timing."""
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    plt.close("all")
+
+    def call():
+        function()
+        plt.close("all")
+
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    times = timer.repeat(repeat, number)
+    return min(times) / number, peak
+
+
+def render(function, *args, **kwargs):
+    # plot and draw the figure, as plots are only rendered when drawn
+    function(*args, **kwargs)
+    plt.gcf().canvas.draw()
+
+
+def cases(mode="quick", directory="."):
+    """Yields the benchmarks as name, parameters, number of blocks and function.
+    The functions bind their arguments, such that they can be collected first.
+    :param directory: directory of the block files that are written."""
+    layouts = {}
+    for size in SIZES[mode]:
+        for pbuild in PBUILDS[mode]:
+            for order in ORDERS:
+                params = layout_params(size, pbuild, order)
+                blocks, greenspace, _ = citygenerator.generate_layout(**params, seed=SEED)
+                layouts[(size, pbuild, order)] = (blocks, greenspace)
+                yield ("generate_layout", dict(size=size, pbuild=pbuild, order=order), len(blocks),
+                       lambda params=params: citygenerator.generate_layout(**params, seed=SEED))
+
+    # the other benchmarks run on the random layouts
+    for size in SIZES[mode]:
+        pbuild = PBUILDS[mode][-1]
+        blocks, greenspace = layouts[(size, pbuild, "random")]
+        params = layout_params(size, pbuild)
+        footprints = citygenerator.BlockArray(blocks.data[:, 0:4])
+        a0 = size * size
+        case = dict(size=size, pbuild=pbuild)
+        n = len(blocks)
+
+        for method in ["grow", "solve"]:
+            yield ("generate_heights", dict(case, method=method), n,
+                   lambda footprints=footprints, params=params, a0=a0, method=method:
+                   heights.generate_heights(footprints, params["pfrontal"] * a0, params["heightrandom"],
+                                            maxheight=round(params["zsize"]/6), minvolume=params["minvolume"],
+                                            seed=SEED, method=method))
+        yield ("convert_blocks_to_greenery", case, n,
+               lambda footprints=footprints, params=params, a0=a0:
+               greenery.convert_blocks_to_greenery(footprints, params["pgreen"] * a0))
+        yield ("calculate_blockstats", case, n,
+               lambda blocks=blocks, a0=a0: utils.calculate_blockstats(blocks, a0=a0))
+        yield ("write", case, n,
+               lambda blocks=blocks, filename=os.path.join(directory, "blocks{}.txt".format(size)):
+               utils.write(blocks, filename))
+        if size in PLOTSIZES:
+            yield ("plot_2dlayout", case, n,
+                   lambda footprints=footprints, size=size:
+                   render(plot.plot_2dlayout, footprints, limits=[0, size, 0, size]))
+            yield ("plot_3dlayout", case, n,
+                   lambda blocks=blocks, size=size, params=params:
+                   render(plot.plot_3dlayout, blocks, limits=[0, size, 0, size, 0, params["zsize"]]))
+
+
+def run_benchmarks(mode="quick", repeat=3):
+    """Runs all benchmarks and returns their results as list of dictionaries."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, params, nblocks, function in cases(mode, tmp):
+            seconds, memory = measure(function, repeat)
+            results.append(dict(name=name, params=params, nblocks=nblocks, time=seconds, memory=memory))
+            print("{:28} {:56} {:8d} blocks {:10.4f} s {:10.2f} MB".format(
+                name, json.dumps(params), nblocks, seconds, memory / 2**20))
+    return results
+
+
+# REPORTS
+# -----------
+
+def key(result):
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline, threshold=0.2):
+    """Compares results to a baseline and returns the regressions, benchmarks that
+    take more than (1 + threshold) times the baseline time."""
+    reference = {key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        if key(result) not in reference:
+            continue
+        ratio = result["time"] / max(reference[key(result)]["time"], 1e-9)
+        if ratio > 1 + threshold:
+            regressions.append(dict(result, ratio=ratio))
+    return regressions
+
+
+def plot_scaling(results, filename):
+    """Plots time and peak memory of all benchmarks against the number of blocks."""
+    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+    curves = {}
+    for result in results:
+        params = {k: v for k, v in result["params"].items() if k not in ["size"]}
+        label = result["name"] + " " + " ".join(str(v) for v in params.values())
+        curves.setdefault(label, []).append(result)
+    for k, (label, curve) in enumerate(curves.items()):
+        curve = sorted(curve, key=lambda r: r["nblocks"])
+        nblocks = [r["nblocks"] for r in curve]
+        # the colours repeat after 10 curves, the line styles tell them apart
+        style = ['o-', 's--', '^:'][k // 10 % 3]
+        axes[0].loglog(nblocks, [r["time"] for r in curve], style, label=label)
+        axes[1].loglog(nblocks, [r["memory"] / 2**20 for r in curve], style, label=label)
+    axes[0].set(xlabel="blocks", ylabel="time [s]")
+    axes[1].set(xlabel="blocks", ylabel="peak memory [MB]")
+    axes[1].legend(fontsize=6, loc="center left", bbox_to_anchor=(1, 0.5))
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the Urban Landscape Generator.")
+    parser.add_argument("--mode", choices=["quick", "full"], default="quick",
+                        help="quick runs small domains only, full runs all domain sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed calls per benchmark")
+    parser.add_argument("--output", default="benchmarks.json", help="JSON file of the results")
+    parser.add_argument("--plot", default=None, help="image file of the scaling curves")
+    parser.add_argument("--baseline", default=None, help="JSON file of earlier results to compare to")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown against the baseline that counts as regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.mode, args.repeat)
+    machine = dict(python=platform.python_version(), numpy=np.__version__,
+                   platform=platform.platform(), processor=platform.processor())
+    with open(args.output, "w") as file:
+        json.dump(dict(machine=machine, mode=args.mode, results=results), file, indent=1)
+    print("results saved in", args.output)
+    if args.plot is not None:
+        plot_scaling(results, args.plot)
+        print("scaling curves saved in", args.plot)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print("regression: {} {} takes {:.2f} times the baseline time".format(
+                r["name"], json.dumps(r["params"]), r["ratio"]))
+        if regressions:
+            sys.exit(1)
+        print("no regressions above {:.0%} of the baseline".format(args.threshold))
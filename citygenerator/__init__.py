@@ -1,4 +1,11 @@
-from .fractal import generate_layout, generate_oneblock
-from .utils import calculate_blockstats
+from .fractal import generate_layout, generate_oneblock, generate_array
+from .utils import calculate_blockstats, blockstats_table
 from .plot import plot_2dlayout, plot_3dlayout
 from .checks import run_checks
+from .blocks import BlockArray
+from .ensemble import generate_ensemble
+from .tiled import generate_tiled
+from .inverse import find_layout
+from .spatial import BlockIndex
+from .streets import StreetNetwork
+from .splittree import SplitTree
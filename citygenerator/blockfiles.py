@@ -0,0 +1,88 @@
+import numpy as np
+from .blocks import BlockArray, BlockBatch, asblockarray
+
+
+# header of text block files, the column names are padded to 100 characters
+HEADER = "{:12}".format('# Block location') + '\n' + "{:100}".format('#  il  iu  jl  ju  kl  ku')
+
+
+def _indices(blocks):
+    # 3D blocks as (N, 6) int32 array of grid indices
+    blocks = asblockarray(blocks)
+    # Checks that blocks are the right length.
+    # If you have only one block, store as blocks = [[block]].
+    if blocks.ncols != 6:
+        raise IndexError("Blocks not the right length.")
+    return np.rint(blocks.data).astype(np.int32)
+
+
+# TEXT FILES
+# -----------
+
+def write_text(blocks, filename):
+    """Writes blocks in grid indices to a text file with one block per line.
+    Values are left aligned in columns of at least 3 characters, the columns
+    get wider if an index has more digits."""
+    indices = _indices(blocks)
+    width = max(3, len(str(np.amax(indices, initial=0))), len(str(np.amin(indices, initial=0))))
+    with open(filename, 'w') as file:
+        file.write(HEADER + '\n')
+        np.savetxt(file, indices, fmt='%-{}d'.format(width), delimiter=' ', newline=' \n')
+
+
+def read_text(filename):
+    """Reads blocks from a text file written by write_text or utils.write."""
+    indices = np.loadtxt(filename, comments='#', ndmin=2)
+    return BlockArray(indices.reshape(-1, 6))
+
+
+# BINARY FILES
+# -----------
+
+def write_raw(blocks, filename):
+    """Writes blocks in grid indices as raw int32 values without header,
+    6 values per block in C order."""
+    _indices(blocks).tofile(filename)
+
+
+def read_raw(filename, mmap=False):
+    """Reads blocks from a raw int32 file written by write_raw.
+    :param mmap: if True, returns a read-only memory-mapped (N, 6) int32 array
+        instead of loading the blocks into a BlockArray."""
+    if mmap is True:
+        return np.memmap(filename, dtype=np.int32, mode='r').reshape(-1, 6)
+    return BlockArray(np.fromfile(filename, dtype=np.int32).reshape(-1, 6))
+
+
+def write_npy(blocks, filename):
+    """Writes blocks in grid indices as (N, 6) int32 array to a .npy file."""
+    np.save(filename, _indices(blocks))
+
+
+def read_npy(filename, mmap=False):
+    """Reads blocks from a .npy file written by write_npy.
+    :param mmap: if True, returns a read-only memory-mapped (N, 6) int32 array
+        instead of loading the blocks into a BlockArray."""
+    if mmap is True:
+        return np.load(filename, mmap_mode='r')
+    return BlockArray(np.load(filename))
+
+
+# BATCHES
+# -----------
+
+def write_batch(layouts, filename, compressed=True):
+    """Writes many layouts in grid indices to one .npz file.
+    The blocks of all layouts are stored as one int32 array 'blocks' with the
+    row offsets of the layouts in 'offsets', see blocks.BlockBatch.
+    :param layouts: list of layouts or BlockBatch."""
+    if not isinstance(layouts, BlockBatch):
+        layouts = BlockBatch.from_layouts(layouts)
+    save = np.savez_compressed if compressed is True else np.savez
+    save(filename, blocks=_indices(BlockArray(layouts.data, ncols=6)), offsets=layouts.offsets)
+
+
+def read_batch(filename):
+    """Reads the layouts of a .npz file written by write_batch as BlockBatch."""
+    with np.load(filename) as file:
+        return BlockBatch(file['blocks'], file['offsets'])
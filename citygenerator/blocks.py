@@ -0,0 +1,276 @@
+import numpy as np
+
+
+class BlockArray:
+    """Container for building blocks backed by a contiguous (N, 6) array.
+    Each row stores a block as [xmin, xmax, ymin, ymax, zmin, zmax].
+    Blocks without heights (2D blocks) are stored with zmin = zmax = 0 and
+    are indexed and exported as [xmin, xmax, ymin, ymax].
+    :param blocks: list of blocks, array of shape (N, 4) or (N, 6), or BlockArray.
+    :param ncols: number of exported columns, 4 for 2D and 6 for 3D blocks.
+        Default is the number of columns of the input."""
+
+    def __init__(self, blocks=(), ncols=None):
+        if isinstance(blocks, BlockArray):
+            array = blocks.data
+            ncols = ncols or blocks.ncols
+        else:
+            array = np.asarray(blocks, dtype=float)
+            if array.size == 0:
+                array = np.zeros((0, 6))
+            elif array.ndim != 2 or array.shape[1] not in (4, 6):
+                # If you have only one block, store as blocks = [[block]].
+                raise IndexError("Blocks not the right length. "
+                                 "Blocks need 4 or 6 entries.")
+            else:
+                ncols = ncols or array.shape[1]
+                array = _pad(array)
+
+        self.ncols = ncols or 4
+        self._data = np.array(array, dtype=float, order='C')
+        self._n = len(array)
+
+    # CONTAINER METHODS
+    # -----------
+
+    @property
+    def data(self):
+        """Returns the (N, 6) array of the stored blocks (view, not a copy)."""
+        return self._data[:self._n]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self._data[:self._n, :self.ncols]
+        if dtype is not None:
+            array = array.astype(dtype, copy=False)
+        if copy:
+            array = array.copy()
+        return array
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self._data[i, :self.ncols]
+
+    def __getitem__(self, index):
+        # single blocks are returned as writeable row views
+        if isinstance(index, (int, np.integer)):
+            return self._data[self._position(index), :self.ncols]
+        elif isinstance(index, tuple):
+            return self.data[:, :self.ncols][index]
+        else:
+            return BlockArray(self.data[index], ncols=self.ncols)
+
+    def __setitem__(self, index, blocks):
+        array = np.asarray(blocks, dtype=float)
+        if isinstance(index, (int, np.integer)):
+            index = self._position(index)
+        self.data[index, :array.shape[-1]] = array
+
+    def __delitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            j = self._position(index)
+            self._data[j:self._n - 1] = self._data[j + 1:self._n]
+            self._n -= 1
+        else:
+            keep = np.ones(self._n, dtype=bool)
+            keep[index] = False
+            m = np.count_nonzero(keep)
+            self._data[:m] = self.data[keep]
+            self._n = m
+
+    def __repr__(self):
+        return "BlockArray(" + repr(np.asarray(self)) + ")"
+
+    def _position(self, index):
+        if not -self._n <= index < self._n:
+            raise IndexError("Block index out of range.")
+        return index % self._n
+
+    def _reserve(self, n):
+        # grow storage geometrically to make appending amortised O(1)
+        if n > len(self._data):
+            capacity = max(n, 2*len(self._data), 8)
+            data = np.zeros((capacity, 6))
+            data[:self._n] = self.data
+            self._data = data
+
+    def append(self, block):
+        """Adds a single block to the end of the array."""
+        self.extend([block])
+
+    def extend(self, blocks):
+        """Adds a list or array of blocks to the end of the array."""
+        if isinstance(blocks, BlockArray):
+            ncols = blocks.ncols
+            array = blocks.data
+        else:
+            array = np.asarray(blocks, dtype=float)
+            if array.size == 0:
+                return
+            if array.ndim != 2 or array.shape[1] not in (4, 6):
+                raise IndexError("Blocks not the right length. "
+                                 "Blocks need 4 or 6 entries.")
+            ncols = array.shape[1]
+            array = _pad(array)
+
+        if ncols > self.ncols:
+            if self._n > 0:
+                raise IndexError("Cannot add 3D blocks to 2D blocks.")
+            self.ncols = ncols
+
+        m = len(array)
+        self._reserve(self._n + m)
+        self._data[self._n:self._n + m] = array
+        self._n += m
+
+    def split(self, j, newblocks):
+        """Replaces block j by a set of new blocks.
+        The new blocks are added to the end of the array and block j is removed."""
+        self.extend(newblocks)
+        del self[j]
+
+    def copy(self):
+        return BlockArray(self)
+
+    def tolist(self):
+        return np.asarray(self).tolist()
+
+    def extrude(self, heights, base=0.):
+        """Returns a new 3D BlockArray with blocks from base to the given heights.
+        :param heights: single height or array of heights for all blocks.
+        :param base: height of the block bottoms, default is 0."""
+        blocks3d = BlockArray(self, ncols=6)
+        blocks3d.data[:, 4] = base
+        blocks3d.data[:, 5] = heights
+        return blocks3d
+
+    # BLOCK PROPERTIES
+    # -----------
+
+    @property
+    def xmin(self):
+        return self.data[:, 0]
+
+    @property
+    def xmax(self):
+        return self.data[:, 1]
+
+    @property
+    def ymin(self):
+        return self.data[:, 2]
+
+    @property
+    def ymax(self):
+        return self.data[:, 3]
+
+    @property
+    def zmin(self):
+        return self.data[:, 4]
+
+    @property
+    def zmax(self):
+        return self.data[:, 5]
+
+    @property
+    def lengths(self):
+        """Block lengths in x."""
+        return self.xmax - self.xmin
+
+    @property
+    def widths(self):
+        """Block widths in y."""
+        return self.ymax - self.ymin
+
+    @property
+    def heights(self):
+        """Block heights in z."""
+        return self.zmax - self.zmin
+
+    @property
+    def plans(self):
+        """Block plan areas."""
+        return self.lengths * self.widths
+
+    @property
+    def fronts(self):
+        """Block frontal areas for wind from x direction (y-z surface)."""
+        return self.widths * self.heights
+
+    @property
+    def sides(self):
+        """Block frontal areas for wind from y direction (x-z surface)."""
+        return self.lengths * self.heights
+
+    @property
+    def volumes(self):
+        """Block volumes."""
+        return self.plans * self.heights
+
+
+def asblockarray(blocks):
+    """Converts a list of blocks to a BlockArray.
+    BlockArray input is returned as it is, without a copy."""
+    if isinstance(blocks, BlockArray):
+        return blocks
+    return BlockArray(blocks)
+
+
+def _pad(array):
+    # add zero heights to 2D blocks
+    if array.shape[1] == 4:
+        array = np.hstack([array, np.zeros((len(array), 2))])
+    return array
+
+
+class BlockBatch:
+    """Ragged batch of block layouts stored in one contiguous (M, 6) array.
+    The blocks of layout i are stored in rows offsets[i]:offsets[i + 1].
+    :param data: array of shape (M, 6) with the blocks of all layouts.
+    :param offsets: array of n + 1 row offsets of n layouts.
+    :param ncols: number of exported columns, 4 for 2D and 6 for 3D blocks."""
+
+    def __init__(self, data, offsets, ncols=6):
+        self.data = np.ascontiguousarray(data, dtype=float).reshape(-1, 6)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ncols = ncols
+
+    @classmethod
+    def from_layouts(cls, layouts):
+        """Creates a batch from a list of layouts."""
+        layouts = [asblockarray(blocks) for blocks in layouts]
+        counts = [len(blocks) for blocks in layouts]
+        offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        data = np.zeros((offsets[-1], 6))
+        for blocks, start in zip(layouts, offsets):
+            data[start:start + len(blocks)] = blocks.data
+        ncols = max([blocks.ncols for blocks in layouts], default=6)
+        return cls(data, offsets, ncols)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """Returns layout i as BlockArray."""
+        if not -len(self) <= i < len(self):
+            raise IndexError("Layout index out of range.")
+        i %= len(self)
+        return BlockArray(self.data[self.offsets[i]:self.offsets[i + 1]], ncols=self.ncols)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return "BlockBatch(%d layouts, %d blocks)" % (len(self), len(self.data))
+
+    @property
+    def counts(self):
+        """Number of blocks of each layout."""
+        return np.diff(self.offsets)
+
+    @property
+    def layout(self):
+        """Layout index of each block."""
+        return np.repeat(np.arange(len(self)), self.counts)
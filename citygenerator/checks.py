@@ -1,81 +1,232 @@
 import numpy as np
+from .blocks import asblockarray
 
 
 def get_heightratios(blocks, domainheight):
     """Function that calculates building height to domain height ratio. 
     General advice: domain height/building height >= 6."""
-    ratios = []
-    for block in blocks:
-        xy = [b for b in block[0:4]]
-        z = block[5]
-        if z > 0:
-            ratio = domainheight/z
-        else:
-            ratio = 0
-        ratios.append(ratio)
+    z = asblockarray(blocks).zmax
+    ratios = np.zeros(len(z))
+    np.divide(domainheight, z, out=ratios, where=(z > 0))
 
     return ratios
 
 
 def get_blockvolumes(blocks):
     """Function that calculates the cube roots of the block volume."""
-    roots = []
-    for block in blocks:
-        volume = (block[1] - block[0])*(block[3] - block[2])*(block[5] - block[4])
-        cuberoot = np.cbrt(volume)
-        roots.append(cuberoot)
+    roots = np.cbrt(asblockarray(blocks).volumes)
         
     return roots
 
 
 def check_heightratio(dimblocks, domainheight, heightratio=6):
     # blocks and limits are dimensionalised
-    problemblocks = []
+    dimblocks = asblockarray(dimblocks)
     # check for domain height zsize over block height zmax ratio:
     ratios = get_heightratios(dimblocks, domainheight)
-    
-    for r, block in zip(ratios, dimblocks):
-        if r < heightratio:
-            problemblocks.append(block)
-            print("Smaller height ratio zsize/zmax = ", r, "with block ", block, ".")
+    problems = heightratio_mask(dimblocks, domainheight, heightratio)
+    problemblocks = dimblocks[problems]
+
+    for r, block in zip(ratios[problems], problemblocks):
+        print("Smaller height ratio zsize/zmax = ", r, "with block ", block, ".")
             
     return problemblocks
 
 
 def check_blockvolume(blocks, blockvolume=10):
     # blocks are in cells, not dimensionalised
-    problemblocks = []
+    blocks = asblockarray(blocks)
     # check for block volume:
     roots = get_blockvolumes(blocks)
-    for r, block in zip(roots, blocks):
-        if r < blockvolume:
-            problemblocks.append(block)
-            print("Smaller block volume with cube root = ", r, "for block ", block, ".")
+    problems = blockvolume_mask(blocks, blockvolume)
+    problemblocks = blocks[problems]
+
+    for r, block in zip(roots[problems], problemblocks):
+        print("Smaller block volume with cube root = ", r, "for block ", block, ".")
             
     return problemblocks
 
 
-def run_checks(blocks, limits, resolution, heightratio=6, blockvolume=10):
-        
-    problemblocks = []
-
-    try:
-        probblocks1 = check_heightratio(blocks, limits[5], heightratio)
-        problemblocks.extend(probblocks1)
-    except Exception:
-        print("Could not check block to domain height ratio.")
-        pass
-        
-    try:
-        # block volume requirement in cells, need to scale from dimensional blocks
-        # resolution = [dx, dy, dz]
-        dimfactor = resolution[0]*resolution[1]*resolution[2]
-        probblocks2 = check_blockvolume(blocks, blockvolume*dimfactor)
-        problemblocks.extend(probblocks2)
-    except Exception:
-        print("Could not check block volume.")
-        pass
-        
+# VALIDATION MASKS
+# -----------
+
+def heightratio_mask(blocks, domainheight, heightratio=6):
+    """Returns a mask of the blocks with domain height / block height < heightratio."""
+    return get_heightratios(blocks, domainheight) < heightratio
+
+
+def blockvolume_mask(blocks, blockvolume=10):
+    """Returns a mask of the blocks with a volume cube root < blockvolume."""
+    return get_blockvolumes(blocks) < blockvolume
+
+
+def bounds_mask(blocks, limits):
+    """Returns a mask of the blocks that are empty or not inside the domain limits
+    [xmin, xmax, ymin, ymax] or [xmin, xmax, ymin, ymax, zmin, zmax]."""
+    blocks = asblockarray(blocks)
+    n = min(len(limits), blocks.ncols) // 2
+    lower = blocks.data[:, 0:2*n:2]
+    upper = blocks.data[:, 1:2*n:2]
+    outside = (lower < np.asarray(limits[0:2*n:2])) | (upper > np.asarray(limits[1:2*n:2]))
+    empty = upper <= lower
+
+    return np.any(outside | empty, axis=1)
+
+
+def close_pairs(blocks, xgap=0., ygap=0., chunksize=2**20):
+    """Returns all pairs of blocks whose footprints are closer than xgap in x and
+    closer than ygap in y, with zero gaps the pairs of overlapping footprints.
+    The pairs are found with sorted intervals in strips along y: each block is put
+    into the strips that it covers, and the blocks are sorted by strip and lower x
+    bound. The candidates of a block are the following blocks in its strip whose
+    lower x bound lies below its upper x bound plus the gap, which are then tested
+    in y in chunks of chunksize pairs. A pair is kept in the first strip of both blocks.
+    :return: array of shape (M, 2) of block indices i < j, sorted by i and j."""
+    blocks = asblockarray(blocks)
+    pairs = [np.zeros((0, 2), dtype=np.int64)]
+    if len(blocks) < 2:
+        return pairs[0]
+    xlower, xupper = blocks.xmin, blocks.xmax + xgap
+    ylower, yupper = blocks.ymin, blocks.ymax + ygap
+
+    # strips of the typical block width, such that a block covers few strips
+    width = max(np.median(yupper - ylower), 1e-12)
+    first = np.floor((ylower - ylower.min()) / width).astype(np.int64)
+    last = np.maximum(np.ceil((yupper - ylower.min()) / width).astype(np.int64) - 1, first)
+    nstrips = last - first + 1
+    block = np.repeat(np.arange(len(blocks)), nstrips)
+    strip = first[block] + np.arange(len(block)) - np.repeat(np.cumsum(nstrips) - nstrips, nstrips)
+
+    # x bounds of the blocks of each strip shifted past the x bounds of the previous strip
+    span = np.amax(xupper) - np.amin(xlower) + 1
+    lower = strip * span + (xlower - np.amin(xlower))[block]
+    upper = strip * span + (xupper - np.amin(xlower))[block]
+    order = np.argsort(lower, kind='stable')
+    end = np.searchsorted(lower[order], upper[order], side='left')
+    counts = np.maximum(end - np.arange(len(order)) - 1, 0)
+
+    total = np.cumsum(counts)
+    start = 0
+    while start < len(order):
+        stop = max(int(np.searchsorted(total, total[start] - counts[start] + chunksize, side='right')), start + 1)
+        c = counts[start:stop]
+        k = np.repeat(np.arange(start, stop), c)
+        m = k + 1 + np.arange(len(k)) - np.repeat(np.cumsum(c) - c, c)
+        i, j = block[order[k]], block[order[m]]
+        keep = ((ylower[j] < yupper[i]) & (ylower[i] < yupper[j]) &
+                (strip[order[k]] == np.maximum(first[i], first[j])))
+        pairs.append(np.sort(np.stack([i[keep], j[keep]], axis=1), axis=1))
+        start = stop
+    pairs = np.concatenate(pairs)
+
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def overlap_pairs(blocks):
+    """Returns all pairs of overlapping blocks as array of shape (M, 2).
+    3D blocks only overlap if also their heights overlap."""
+    blocks = asblockarray(blocks)
+    pairs = close_pairs(blocks)
+    if blocks.ncols == 6:
+        i, j = pairs.T
+        pairs = pairs[(blocks.zmin[i] < blocks.zmax[j]) & (blocks.zmin[j] < blocks.zmax[i])]
+
+    return pairs
+
+
+def gap_pairs(blocks, xgap, ygap, limits=None):
+    """Returns all pairs of blocks with footprints that do not overlap, but are closer
+    than xgap in x and ygap in y, i.e. that are separated by too narrow streets.
+    :param limits: domain limits [xmin, xmax, ymin, ymax, ...] of a periodic layout.
+        If given, the blocks near the domain boundary are also compared to the blocks
+        across it, shifted by the domain lengths. Blocks that touch across the boundary
+        are the parts of one block that is split by it and are not a pair. A block that
+        is close to its own periodic copy is returned as pair (i, i)."""
+    blocks = asblockarray(blocks)
+    pairs = close_pairs(blocks, xgap, ygap)
+    i, j = pairs.T
+    apart = ((blocks.xmax[i] <= blocks.xmin[j]) | (blocks.xmax[j] <= blocks.xmin[i]) |
+             (blocks.ymax[i] <= blocks.ymin[j]) | (blocks.ymax[j] <= blocks.ymin[i]))
+    pairs = pairs[apart]
+
+    if limits is not None:
+        lx = limits[1] - limits[0]
+        ly = limits[3] - limits[2]
+        near = np.flatnonzero((blocks.xmin < limits[0] + xgap) | (blocks.xmax > limits[1] - xgap) |
+                              (blocks.ymin < limits[2] + ygap) | (blocks.ymax > limits[3] - ygap))
+        n = len(near)
+        # the blocks near the boundary and their copies in the eight neighbouring domains
+        shifts = np.array([[sx * lx, sx * lx, sy * ly, sy * ly]
+                           for sx in (-1, 0, 1) for sy in (-1, 0, 1) if (sx, sy) != (0, 0)])
+        data = blocks.data[near, 0:4]
+        copies = np.concatenate([data] + [data + shift for shift in shifts])
+        a, b = close_pairs(copies, xgap, ygap).T
+        a, b = a[(a < n) & (b >= n)], b[(a < n) & (b >= n)]
+        # pairs with a street between them, not touching parts of one block
+        gaps = np.maximum(np.maximum(copies[b, 0] - copies[a, 1], copies[a, 0] - copies[b, 1]),
+                          np.maximum(copies[b, 2] - copies[a, 3], copies[a, 2] - copies[b, 3]))
+        a, b = near[a[gaps > 0]], near[b[gaps > 0] % n]
+        periodic = np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1)
+        pairs = np.unique(np.concatenate([pairs, periodic]), axis=0)
+
+    return pairs
+
+
+def pairs_mask(pairs, n):
+    """Returns a mask of the n blocks that are part of any of the pairs."""
+    mask = np.zeros(n, dtype=bool)
+    mask[pairs.ravel()] = True
+    return mask
+
+
+# -----------
+# MAIN CHECK FUNCTIONS
+
+def validate(blocks, limits, resolution, heightratio=6, blockvolume=10, mincells=1, periodic=True):
+    """Validates a dimensional layout for LES without printing.
+    :param limits: domain limits [xmin, xmax, ymin, ymax, zmin, zmax].
+    :param resolution: grid spacing [dx, dy, dz].
+    :param mincells: minimum number of cells between blocks.
+    :param periodic: if True, the gaps between blocks are also checked across the
+        periodic domain boundary, see gap_pairs.
+    :return: report as dictionary with a mask over the blocks for each check,
+        the pairs of overlapping blocks and of blocks with too narrow gaps,
+        and 'valid', which is True if no block fails any check."""
+    blocks = asblockarray(blocks)
+    # block volume requirement in cells, need to scale from dimensional blocks
+    dimfactor = resolution[0]*resolution[1]*resolution[2]
+
+    report = {}
+    report['heightratio'] = heightratio_mask(blocks, limits[5], heightratio)
+    report['blockvolume'] = blockvolume_mask(blocks, blockvolume*dimfactor)
+    report['bounds'] = bounds_mask(blocks, limits)
+    report['overlaps'] = overlap_pairs(blocks)
+    report['overlap'] = pairs_mask(report['overlaps'], len(blocks))
+    report['gaps'] = gap_pairs(blocks, mincells*resolution[0], mincells*resolution[1],
+                               limits if periodic else None)
+    report['gap'] = pairs_mask(report['gaps'], len(blocks))
+
+    report['problems'] = (report['heightratio'] | report['blockvolume'] | report['bounds']
+                          | report['overlap'] | report['gap'])
+    report['valid'] = not np.any(report['problems'])
+
+    return report
+
+
+def run_checks(blocks, limits, resolution, heightratio=6, blockvolume=10, mincells=1, periodic=True):
+    # prints the results of validate and returns all blocks that fail a check
+    blocks = asblockarray(blocks)
+    report = validate(blocks, limits, resolution, heightratio, blockvolume, mincells, periodic)
+
+    messages = {'heightratio': "Smaller height ratio zsize/zmax than %g" % heightratio,
+                'blockvolume': "Smaller block volume cube root than %g" % blockvolume,
+                'bounds': "Outside of the domain or empty",
+                'overlap': "Overlapping other blocks",
+                'gap': "Closer to other blocks than %g cells" % mincells}
+    for key, message in messages.items():
+        for block in blocks[report[key]]:
+            print(message + " for block ", block, ".")
+
     print("Checks completed.")
     
-    return problemblocks
+    return blocks[report['problems']]
@@ -0,0 +1,149 @@
+import os
+import sys
+import math
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from . import fractal
+from .blocks import BlockBatch
+
+
+# SUPPORT FUNCTIONS FOR ENSEMBLES
+# -----------
+
+def spawn_seeds(n, seed=None):
+    """Returns n independent seed sequences derived from one master seed.
+    If seed is None, the master seed is drawn from Python's random module."""
+    if seed is None:
+        seed = random.getrandbits(128)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+def generate_realisations(params, seeds):
+    """Generates one layout per seed and returns blocks and greenspace of all
+    layouts as one array, with the number of blocks and green blocks per layout."""
+    layouts = []
+    counts = np.zeros((len(seeds), 2), dtype=np.int64)
+    for i, seed in enumerate(seeds):
+        blocks, greenspace, _ = fractal.generate_layout(**params, seed=seed)
+        layouts.extend([blocks.data, greenspace.data])
+        counts[i] = [len(blocks), len(greenspace)]
+    data = np.concatenate(layouts) if layouts else np.zeros((0, 6))
+    return data, counts
+
+
+def _share(data):
+    # worker: copy a block array into shared memory and return its name, the parent
+    # process unlinks the memory in _collect_shared. Before Python 3.13 the memory
+    # stays registered with the resource tracker of the parent, which the workers
+    # share, so that the tracker removes the memory of a failed task at exit.
+    size = max(data.nbytes, 1)
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(create=True, size=size, track=False)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name
+
+
+def _generate_shared(params, seeds):
+    # worker: generate layouts and hand the block array back in shared memory
+    data, counts = generate_realisations(params, seeds)
+    return _share(data), counts
+
+
+def _collect_shared(name, counts):
+    # copy a worker result out of shared memory and release the memory
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        nrows = np.sum(counts)
+        data = np.ndarray((nrows, 6), dtype=float, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return data
+
+
+def _run_shared(function, tasks, workers):
+    # run worker tasks that return block arrays in shared memory, and stack
+    # their blocks and counts in order of the tasks
+    results = []
+    errors = []
+    # start the resource tracker here, such that the workers share it
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(function, *task) for task in tasks]
+        # collect in order of submission to keep realisation order,
+        # and release the shared memory of all tasks before raising errors
+        for future in futures:
+            try:
+                name, counts = future.result()
+            except Exception as error:
+                errors.append(error)
+                continue
+            results.append((_collect_shared(name, counts), counts))
+    if errors:
+        raise errors[0]
+
+    data = np.concatenate([r[0] for r in results])
+    counts = np.concatenate([r[1] for r in results])
+    return data, counts
+
+
+def split_blocks(data, counts):
+    """Splits the stacked blocks and greenspace of several layouts into two batches."""
+    rows = counts.ravel()
+    isblock = np.zeros(len(rows), dtype=bool)
+    isblock[0::2] = True
+    # rows of each layout part: blocks, green, blocks, green, ...
+    part = np.repeat(np.arange(len(rows)), rows)
+    blockrows = isblock[part]
+    blocks = BlockBatch(data[blockrows], np.concatenate([[0], np.cumsum(counts[:, 0])]))
+    greenspace = BlockBatch(data[~blockrows], np.concatenate([[0], np.cumsum(counts[:, 1])]))
+    return blocks, greenspace
+
+
+# -----------
+# MAIN ENSEMBLE FUNCTION
+
+def generate_ensemble(n, params, workers=None, seed=None, chunksize=None):
+    """Generates an ensemble of n statistically equivalent layouts.
+    Realisation i is generated from the i-th child seed of the master seed,
+    so that the ensemble does not depend on the number of workers.
+    :param n: number of layouts.
+    :param params: dictionary of keyword arguments for generate_layout.
+    Optional:
+    :param workers: number of worker processes. Default is the number of cores,
+        workers=1 generates all layouts in the current process.
+    :param seed: master seed, integer or numpy SeedSequence.
+        If None, it is drawn from Python's random module.
+    :param chunksize: number of layouts per task. Default divides the layouts into
+        four tasks per worker.
+    :return: blocks and greenspace of all layouts as BlockBatch."""
+
+    if "seed" in params or "savesteps" in params:
+        raise ValueError("Ensemble parameters cannot contain seed or savesteps.")
+
+    seeds = spawn_seeds(n, seed)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, math.ceil(n / (4 * workers)))
+
+    if workers == 1 or n <= 1:
+        data, counts = generate_realisations(params, seeds)
+        return split_blocks(data, counts)
+
+    chunks = [seeds[i:i + chunksize] for i in range(0, n, chunksize)]
+    data, counts = _run_shared(_generate_shared, [(params, chunk) for chunk in chunks], workers)
+
+    return split_blocks(data, counts)
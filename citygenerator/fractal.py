@@ -1,114 +1,82 @@
-import random
 import math
-import copy
 import numpy as np
-from . import utils
 from . import heights
 from . import randomiser
 from . import greenery
+from .blocks import BlockArray
+from .subdivision import Subdivision
+from .history import History
 
 
-def get_streetwidth(n, randomness=0, layout="s", delta=1):
-    """ Function that returns a random street width. The width depends on level of iteration.
+# street widths in metres
+STREETWIDTHS = {"boulevard": [27, 36],
+                "highstreet": [18, 30],
+                "residentialstreet": [12, 18],
+                "mews": [8, 12]}
+
+
+def get_streettype(n, layout="s"):
+    """ Function that returns the street type. The type depends on level of iteration.
     :param n: current number of blocks
-    :param randomised: whether width is random number in interval or set width
-    :param degree: degree of randomness
     :param layout: large, small or None
-    :param delta: spatial resolution, default is 1 m
-    :return: random street width
-    """""
-    # initialise street width, values in metres:
-    boulevard = [27, 36]
-    highstreet = [18, 30]
-    residentialstreet = [12, 18]
-    mews = [8, 12]
-
+    :return: street type, key of STREETWIDTHS
+    """
     if layout in ["large", "l"]:
         # chose street type by number of existing blocks:
         if n == 1:
-            widths = boulevard
+            streettype = "boulevard"
         elif 2 <= n <= 5:  # n can actually only be 4
-            widths = highstreet
+            streettype = "highstreet"
         elif 6 <= n <= 11:  # n can actually only be 7 or 10
-            widths = residentialstreet
+            streettype = "residentialstreet"
         else:
-            widths = mews
+            streettype = "mews"
     elif layout in ["small", "s"]:
         if n <= 4:
-            widths = residentialstreet
+            streettype = "residentialstreet"
         else:
-            widths = mews
+            streettype = "mews"
     else:
         # chose street type by number of existing blocks:
         if n == 1:
-            widths = highstreet
+            streettype = "highstreet"
         elif 2 <= n <= 8:  # n can actually only be 4 or 7
-            widths = residentialstreet
+            streettype = "residentialstreet"
         else:
-            widths = mews
-    
-    # get a set of widths that are conform with the resolution
-    interval = np.arange(widths[0], widths[1] + delta, delta)
-    width = randomiser.draw_from_interval(interval, randomness, weight='mid')
+            streettype = "mews"
 
-    return width
+    return streettype
 
 
-def choose_randomblock(blocks, xwidth, ywidth, order, minwidth=10):
-    n = len(blocks)
-
-    if order in ["random", "r"]:
-        j = random.randrange(n)  # pick random block
-        # test if block is large enough if not move to next one
-        i = 0
-        while (i <= 5 * n) and (xwidth >= (blocks[j][1] - blocks[j][0] - minwidth)) or \
-                (ywidth >= (blocks[j][3] - blocks[j][2] - minwidth)):
-            j = random.randrange(n)  # pick another random block
-            i += 1
-        # if we cannot find a block after 5n iterations, return none
-        if i >= 5 * n:
-            print("Warning: blocks are too small, further block division stopped.")
-            return
-
-    elif order in ["hierarchical", "h"]:
-        j = 0
-        # test if block is large enough if not move to next one
-        while (j <= n) and (xwidth >= (blocks[j][1] - blocks[j][0] - minwidth)) or \
-                (ywidth >= (blocks[j][3] - blocks[j][2] - minwidth)):
-            j += 1
-        # if all blocks are too small, return none
-        if j >= n:
-            print("Warning: blocks are too small, further block division stopped.")
-            return
-
-    elif order in ["cascade", "c"]:
-        if n == 1:
-            j = 0
-        else:
-            # find block with largest area amongst newest blocks
-            bmax = np.argmax([utils.blockplan([block]) for block in blocks[-4:]])
-            j = bmax + (n - 4)
-            # if block is too small, return none
-            if (j <= n) and (xwidth >= (blocks[j][1] - blocks[j][0] - minwidth)) or \
-                    (ywidth >= (blocks[j][3] - blocks[j][2] - minwidth)):
-                print("Warning: blocks are too small, further block division stopped.")
-                return
+def get_streetwidth(n, randomness=0, layout="s", delta=1, sampler=None):
+    """ Function that returns a random street width. The width depends on level of iteration.
+    :param n: current number of blocks
+    :param randomness: degree of randomness
+    :param layout: large, small or None
+    :param delta: spatial resolution, default is 1 m
+    :param sampler: randomiser.Sampler to draw from, replaces randomness if given
+    :return: random street width
+    """""
+    if sampler is None:
+        sampler = randomiser.Sampler(randomness)
+    widths = STREETWIDTHS[get_streettype(n, layout)]
 
-    else:
-        raise ValueError("The input order could not be found."
-                         "Options for order are: 'random', 'hierarchical' and 'cascade'.")
+    # get a set of widths that are conform with the resolution
+    interval = sampler.interval(widths[0], widths[1], delta)
+    width = sampler.draw(interval, weight='mid')
 
-    return j
+    return width
 
 
-def get_intersection(corners, width, randomness=0., minwidth=10, delta=1):
+def get_intersection(corners, width, randomness=0., minwidth=10, delta=1, sampler=None):
     # minwidth is dimensional parameter (in metres)
+    if sampler is None:
+        sampler = randomiser.Sampler(randomness)
 
     lowcorner = corners[0] + minwidth + math.floor(width/delta/2)*delta
     highcorner = corners[1] - minwidth - math.ceil(width/delta/2)*delta
-    # get a set of widths that are conform with the resolution
-    interval = np.arange(lowcorner, highcorner + delta, delta)
-    intersec = randomiser.draw_from_interval(interval, randomness, weight='mid')
+    # draw from a set of points that are conform with the resolution
+    intersec = sampler.draw_range(lowcorner, highcorner, delta, weight='mid')
 
     return intersec
 
@@ -121,54 +89,38 @@ def create_newcorners(corners, separation, width, delta):
     return [min1, max1], [min2, max2]
 
 
-def generate_layout(xsize, ysize, zsize, imax, jtot, kmax, 
-                    pbuild, pgreen, pfrontal, order="random",
-                    layoutrandom=0., heightrandom=0.,
-                    margin=4, minwidth=5, minvolume=10,
-                    savesteps=False):
-    # margin, minwidth and minvolume are currently all dimensional parameters,
-    # think about this when setting standards!
-    
-    a0 = xsize * ysize  # domain size
-    # resolution
-    dx = xsize/imax
-    dy = ysize/jtot
-    dz = zsize/kmax
-    percentage = pbuild + pgreen  # target build-up density
-    blocks = []
-
-    xwidth = get_streetwidth(n=1, randomness=layoutrandom, delta=dx)
-    ywidth = get_streetwidth(n=1, randomness=layoutrandom, delta=dy)
-
-    # main intersection in upper right corner
-    ablocks = (xsize - xwidth) * (ysize - ywidth)
-    blocks.append([margin, xsize + margin - xwidth, 
-                   margin, ysize + margin - ywidth])
-
-    generationsteps = []
-    # to save intermediate layouts
-    if savesteps is True:
-        generationsteps.append(copy.deepcopy(blocks))
+def subdivide(blocks, target, sampler, rng, order="random", dx=1, dy=1, minwidth=5,
+              history=None, streets=None, tree=None):
+    """Splits the blocks of a Subdivision engine until their plan area is at most
+    1.1 times the target area, or no block is large enough for the drawn streets.
+    Every split draws two streets and an intersection point in a selected block
+    and replaces it by the four blocks around the intersection.
+    :param blocks: subdivision.Subdivision, split in place.
+    :param target: target plan area of the blocks.
+    :param sampler: randomiser.Sampler for street widths and intersections.
+    :param rng: numpy random generator for the block selection.
+    Optional:
+    :param history, streets, tree: recorders of the splits, see generate_layout.
+    :return: the Subdivision engine."""
 
-    # MAIN LOOP
-    # split blocks until buildup surface area is small enough
-    while ablocks > 1.1*(a0 * percentage):
+    ablocks = blocks.area
+    while ablocks > 1.1*target:
 
         nbl = len(blocks)  # number of blocks
 
         # pick random street widths
-        xwidth = get_streetwidth(n=nbl, randomness=layoutrandom, delta=dx)
-        ywidth = get_streetwidth(n=nbl, randomness=layoutrandom, delta=dy)
+        xwidth = get_streetwidth(n=nbl, delta=dx, sampler=sampler)
+        ywidth = get_streetwidth(n=nbl, delta=dy, sampler=sampler)
         
-        # pick block according to defined order. if none, order is random.
-        j = choose_randomblock(blocks=blocks, xwidth=xwidth, ywidth=ywidth, order=order, minwidth=2*minwidth)
+        # pick block according to defined order
+        j = blocks.select(order=order, xwidth=xwidth, ywidth=ywidth, rng=rng)
         # if no suitable block found, return blocks as they are
         if j is None:
             break
 
         # pick random intersection point
-        xintersection = get_intersection(corners=blocks[j][0:2], width=xwidth, randomness=layoutrandom, minwidth=minwidth, delta=dx)
-        yintersection = get_intersection(corners=blocks[j][2:4], width=ywidth, randomness=layoutrandom, minwidth=minwidth, delta=dy)
+        xintersection = get_intersection(corners=blocks[j][0:2], width=xwidth, minwidth=minwidth, delta=dx, sampler=sampler)
+        yintersection = get_intersection(corners=blocks[j][2:4], width=ywidth, minwidth=minwidth, delta=dy, sampler=sampler)
             
         # create new block coordinates
         # takes [xmin xmax] of block j
@@ -182,31 +134,142 @@ def generate_layout(xsize, ysize, zsize, imax, jtot, kmax,
         newblock3 = [*x2, *y2]
         newblock4 = [*x1, *y2]
 
-        # add new blocks to blocks list
-        blocks.extend([newblock1, newblock2, newblock3, newblock4])
+        # add new blocks to blocks list and remove old block
+        blocks.split(j, [newblock1, newblock2, newblock3, newblock4])
+        if streets is not None:
+            streets.split(j, xintersection, yintersection, xwidth, ywidth, get_streettype(nbl))
+        if tree is not None:
+            tree.split(j, [newblock1, newblock2, newblock3, newblock4])
+
+        # new block area is updated by the split
+        ablocks = blocks.area
 
-        # remove old block
-        del blocks[j]
+        if history is not None:
+            history.step(4)
+
+    return blocks
 
-        # compute new block area
-        ablocks = sum([utils.blockplan([b]) for b in blocks])
 
-        if savesteps is True:
-            generationsteps.append(copy.deepcopy(blocks))
+def generate_layout(xsize, ysize, zsize, imax, jtot, kmax, 
+                    pbuild, pgreen, pfrontal, order="random",
+                    layoutrandom=0., heightrandom=0.,
+                    margin=4, minwidth=5, minvolume=10,
+                    savesteps=False, seed=None, streets=None, tree=None, heightmethod="grow"):
+    # margin, minwidth and minvolume are currently all dimensional parameters,
+    # think about this when setting standards!
+    # heightmethod is the method of heights.generate_heights, 'grow' or 'solve'
+    # seed is None, an integer or a numpy random generator, see randomiser.get_rng
+    # streets is an optional streets.StreetNetwork that records the drawn streets
+    # tree is an optional splittree.SplitTree that records the splits and final blocks
+    rng = randomiser.get_rng(seed)
+    sampler = randomiser.Sampler(layoutrandom, rng)
+    
+    a0 = xsize * ysize  # domain size
+    # resolution
+    dx = xsize/imax
+    dy = ysize/jtot
+    dz = zsize/kmax
+    percentage = pbuild + pgreen  # target build-up density
+
+    xwidth = get_streetwidth(n=1, delta=dx, sampler=sampler)
+    ywidth = get_streetwidth(n=1, delta=dy, sampler=sampler)
+
+    # all street widths that can be drawn, to index blocks that are large enough
+    xwidths = np.concatenate([sampler.interval(*w, dx) for w in STREETWIDTHS.values()])
+    ywidths = np.concatenate([sampler.interval(*w, dy) for w in STREETWIDTHS.values()])
+
+    # to save intermediate layouts as events, see history.History
+    generationsteps = History()
+    # main intersection in upper right corner
+    blocks = Subdivision([margin, xsize + margin - xwidth, 
+                          margin, ysize + margin - ywidth],
+                         xwidths, ywidths, minwidth=2*minwidth,
+                         history=generationsteps if savesteps is True else None)
+    if savesteps is True:
+        generationsteps.step(4)
+    if streets is not None:
+        streets.start(xsize + margin - xwidth/2, ysize + margin - ywidth/2, xsize, ysize,
+                      xwidth, ywidth, get_streettype(1))
+    if tree is not None:
+        tree.start(blocks[0], dx=dx, dy=dy, dz=dz, order=order, layoutrandom=layoutrandom,
+                   heightrandom=heightrandom, minwidth=minwidth, minvolume=minvolume,
+                   maxheight=round(zsize/6), heightmethod=heightmethod)
+
+    # MAIN LOOP
+    # split blocks until buildup surface area is small enough
+    subdivide(blocks, target=(a0 * percentage), sampler=sampler, rng=rng, order=order,
+              dx=dx, dy=dy, minwidth=minwidth, history=generationsteps if savesteps is True else None,
+              streets=streets, tree=tree)
+
+    liveslots = np.flatnonzero(blocks.used)
+    blocks = blocks.blocks()
 
     # define blocks that are greenspace
-    tmpblocks, tmpgreen = greenery.convert_blocks_to_greenery(blocks=blocks, target=(pgreen * a0))
+    tmpblocks, tmpgreen, selection = greenery.convert_blocks_to_greenery(blocks=blocks, target=(pgreen * a0))
+    if not selection['found']:
+        print("Warning: could not find suitable blocks for green space.")
 
     # add heights to blocks and add zero height to greenery
-    blocks3d, heightgenerationsteps = heights.generate_heights(blocks=tmpblocks, target=(pfrontal * a0), randomness=heightrandom, maxheight=round(zsize/6), minvolume=minvolume, delta=dz, savesteps=savesteps)
+    blocks3d, heightgenerationsteps = heights.generate_heights(blocks=tmpblocks, target=(pfrontal * a0), randomness=heightrandom, maxheight=round(zsize/6), minvolume=minvolume, delta=dz, savesteps=savesteps, seed=rng, method=heightmethod)
     greenspace, greenheights = heights.generate_heights(blocks=tmpgreen, target=0)
     
+    green = np.zeros(len(liveslots), dtype=bool)
+    green[selection['indices']] = True
+    if streets is not None:
+        streets.select(liveslots[~green])
+    if tree is not None:
+        tree.finish(liveslots, green, blocks3d, greenspace)
     if savesteps is True:
-        generationsteps.extend(copy.deepcopy(heightgenerationsteps))
+        # the first height step closes with the removal of the green blocks
+        generationsteps.remove(liveslots[green])
+        generationsteps.extend(heightgenerationsteps, liveslots[~green])
      
     return blocks3d, greenspace, generationsteps
 
 
+def generate_block(block, pbuild, pgreen, pfrontal, dx, dy, dz, order="random",
+                   layoutrandom=0., heightrandom=0., minwidth=5, minvolume=10, maxheight=50,
+                   seed=None, tree=None, heightmethod="grow"):
+    """Generates the layout inside one block, like generate_layout generates a domain.
+    The block is subdivided until the target plan area is reached, then green space
+    is selected and heights are added to the remaining blocks.
+    :param block: block [xmin, xmax, ymin, ymax] that is subdivided.
+    :param pbuild, pgreen, pfrontal: plan, green and frontal area densities,
+        relative to the plan area of the block.
+    :param dx, dy, dz: resolution.
+    Optional:
+    :param maxheight: maximum building height.
+    :param seed: None, an integer, SeedSequence or numpy random generator.
+    :param tree: splittree.SplitTree whose slot 0 is the node of the block.
+    :param heightmethod: method of heights.generate_heights, 'grow' or 'solve'.
+    :return: blocks and greenspace."""
+    rng = randomiser.get_rng(seed)
+    sampler = randomiser.Sampler(layoutrandom, rng)
+    area = (block[1] - block[0]) * (block[3] - block[2])
+
+    xwidths = np.concatenate([sampler.interval(*w, dx) for w in STREETWIDTHS.values()])
+    ywidths = np.concatenate([sampler.interval(*w, dy) for w in STREETWIDTHS.values()])
+    blocks = Subdivision(block, xwidths, ywidths, minwidth=2*minwidth)
+    subdivide(blocks, target=((pbuild + pgreen) * area), sampler=sampler, rng=rng, order=order,
+              dx=dx, dy=dy, minwidth=minwidth, tree=tree)
+
+    liveslots = np.flatnonzero(blocks.used)
+    tmpblocks, tmpgreen, selection = greenery.convert_blocks_to_greenery(blocks=blocks.blocks(), target=(pgreen * area))
+    if not selection['found']:
+        print("Warning: could not find suitable blocks for green space.")
+    blocks3d, _ = heights.generate_heights(blocks=tmpblocks, target=(pfrontal * area), randomness=heightrandom,
+                                           maxheight=maxheight, minvolume=minvolume, delta=dz, seed=rng,
+                                           method=heightmethod)
+    greenspace, _ = heights.generate_heights(blocks=tmpgreen, target=0)
+
+    if tree is not None:
+        green = np.zeros(len(liveslots), dtype=bool)
+        green[selection['indices']] = True
+        tree.finish(liveslots, green, blocks3d, greenspace)
+
+    return blocks3d, greenspace
+
+
 def generate_oneblock(xsize, ysize, lp, lf,
             margin=8, zmargin=0, exact=False):
 
@@ -241,6 +304,97 @@ def generate_oneblock(xsize, ysize, lp, lf,
     
     z = round(htarget/y)
 
-    blocks =  [[margin, x+margin, margin, y+margin, zmargin, z+zmargin]]
+    blocks = BlockArray([[margin, x+margin, margin, y+margin, zmargin, z+zmargin]])
+
+    return blocks
+
+
+def generate_array(xsize, ysize, lp, lf, nx, ny, arrangement="aligned", heights=None,
+                   margin=0, zmargin=0, delta=1):
+    """Generates a regular array of nx x ny blocks, one block per cell of the domain.
+    Blocks have the aspect ratio of the cells, their plan area gives the building
+    area density lp and their heights the frontal area density lf. In a
+    staggered array every second row is shifted by half a cell in x, and blocks
+    that cross the domain boundary in x are split periodically.
+    The heights are scaled after the split, as both parts of a split block have a front.
+    All blocks are created at once with array operations.
+    Required:
+    :param xsize, ysize: horizontal domain size.
+    :param lp: building area density.
+    :param lf: frontal area density.
+    :param nx, ny: number of blocks in x and y.
+    Optional:
+    :param arrangement: 'aligned' or 'staggered'.
+    :param heights: relative block heights, scaled to the frontal area of lf.
+        A scalar, an array of all nx * ny blocks in row order or an array of
+        shape (py, px) that is repeated as pattern over the rows and columns.
+    :param margin, zmargin: offset of the domain.
+    :param delta: resolution, block edges and heights are rounded to multiples of delta.
+        Blocks are at most one cell minus delta long and wide, to leave streets.
+    :return: blocks ordered by rows in y and by x within each row."""
+
+    # cell size and block size in the cells
+    xcell = xsize / nx
+    ycell = ysize / ny
+    length = max(round(math.sqrt(lp) * xcell / delta), 1) * delta
+    width = max(round(math.sqrt(lp) * ycell / delta), 1) * delta
+    # blocks of neighbouring cells are at least one delta apart
+    maxlength = math.floor((xcell - delta) / delta + 1e-9) * delta
+    maxwidth = math.floor((ycell - delta) / delta + 1e-9) * delta
+    if maxlength < delta or maxwidth < delta:
+        raise ValueError("The cells of {} x {} blocks are too small for blocks and streets "
+                         "of at least delta={}.".format(nx, ny, delta))
+    if length > maxlength or width > maxwidth:
+        print("Warning: blocks fill the cells, block size is reduced to leave streets of delta.")
+        length = min(length, maxlength)
+        width = min(width, maxwidth)
+
+    if heights is None:
+        heights = 1.
+    heights = np.asarray(heights, dtype=float)
+    if heights.ndim == 2:
+        py, px = heights.shape
+        heights = np.tile(heights, (math.ceil(ny / py), math.ceil(nx / px)))[:ny, :nx]
+    heights = np.broadcast_to(heights, (ny, nx)) if heights.ndim == 0 else heights.reshape(ny, nx)
+
+    # blocks centred in their cells, rows in y and blocks in x within rows
+    # one offset is snapped to delta, such that all cells have the same pitch
+    x = math.floor((xcell - length) / 2 / delta + 0.5) * delta + np.arange(nx) * xcell
+    y = math.floor((ycell - width) / 2 / delta + 0.5) * delta + np.arange(ny) * ycell
+    data = np.empty((ny, nx, 6))
+    data[..., 0] = x
+    data[..., 1] = x + length
+    data[..., 2] = y[:, None]
+    data[..., 3] = y[:, None] + width
+    data[..., 4] = 0
+    data[..., 5] = heights
+    blocks = BlockArray(data.reshape(-1, 6))
+
+    if arrangement in ["staggered", "s"]:
+        odd = np.repeat(np.arange(ny) % 2 == 1, nx)
+        shift = round(xcell / 2 / delta) * delta
+        # shift the odd rows in x only and split the blocks that cross x = xsize
+        shifted = blocks.data[odd].copy()
+        shifted[:, 0] = (shifted[:, 0] + shift) % xsize
+        shifted[:, 1] = shifted[:, 0] + length
+        crossing = shifted[:, 1] > xsize
+        wrapped = shifted[crossing].copy()
+        wrapped[:, 0] = 0
+        wrapped[:, 1] -= xsize
+        shifted[crossing, 1] = xsize
+        parts = np.concatenate([blocks.data[~odd], shifted, wrapped])
+        blocks = BlockArray(parts[parts[:, 1] - parts[:, 0] > 1e-9 * xsize])
+        blocks = blocks[np.lexsort((blocks.xmin, blocks.ymin))]
+    elif arrangement not in ["aligned", "a"]:
+        raise ValueError("The input arrangement could not be found."
+                         "Options for arrangement are: 'aligned' and 'staggered'.")
+
+    # scale the relative heights to the frontal area of the blocks after the split
+    relative = blocks.data[:, 5]
+    scale = lf * xsize * ysize / np.sum(blocks.widths * relative)
+    blocks.data[:, 5] = np.maximum(np.round(relative * scale / delta), 1) * delta
+
+    blocks.data[:, 0:4] += margin
+    blocks.data[:, 4:6] += zmargin
 
     return blocks
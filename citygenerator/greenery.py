@@ -1,72 +1,164 @@
-from . import utils
+import numpy as np
+from .blocks import asblockarray
 
 
-def convert_blocks_to_greenery(blocks, target):
-    """Function to convert target surface of blocks into green space."""
+def find_ksum(areas, k, low, high, start=0):
+    """Finds k areas of a sorted array whose sum lies within [low, high].
+    Areas are taken from areas[start:]. The last two areas are searched for all
+    remaining combinations at once by binary search, the sum closest to the centre
+    of the interval is returned. Further areas are fixed in increasing order, so
+    the search takes O(n^(k-1)) time for k > 2 and is only used up to k = 3,
+    see find_subset for larger sets.
+    :return: list of k indices of the areas, None if there is no such set."""
 
-    greenspace = []
+    n = len(areas)
+    if n - start < k:
+        return None
 
-    if target is 0:
-        return blocks, greenspace
+    if k == 1:
+        # areas in the interval, take the one closest to the centre
+        i0 = np.searchsorted(areas, low, side='left')
+        i1 = np.searchsorted(areas, high, side='right')
+        i0 = max(i0, start)
+        if i0 >= i1:
+            return None
+        i = i0 + np.argmin(np.abs(areas[i0:i1] - (low + high) / 2))
+        return [int(i)]
+
+    elif k == 2:
+        # for each first area, the second areas in the interval of the remainder
+        first = areas[start:n - 1]
+        offsets = np.arange(start + 1, n)
+        j0 = np.maximum(np.searchsorted(areas, low - first, side='left'), offsets)
+        j1 = np.searchsorted(areas, high - first, side='right')
+        valid = j0 < j1
+        if not np.any(valid):
+            return None
+        # second area closest to the centre of the interval
+        centre = (low + high) / 2
+        target = np.searchsorted(areas, centre - first)
+        error = np.full(len(first), np.inf)
+        second = np.zeros(len(first), dtype=int)
+        for candidate in (target - 1, target):
+            j = np.clip(np.clip(candidate, j0, j1 - 1), 0, n - 1)
+            e = np.abs(first + areas[j] - centre)
+            better = valid & (e < error)
+            error[better] = e[better]
+            second[better] = j[better]
+        i = int(np.argmin(error))
+        return [start + i, int(second[i])]
 
     else:
-        area = [utils.blockplan([b]) for b in blocks]
-
-        agreen = 0
-        n = len(blocks)
-
-        # check if any of the blocks is the size of greenery
-        i = 0
-        while (i < n) and (agreen == 0):
-            if target * 0.9 <= area[i] <= target * 1.1:
-                agreen = area[i]
-                greenspace.extend([blocks[i]])
-                del blocks[i]
-                print("One block transformed to green space")
-            i += 1
-
-        # check if any two of the blocks add up to the required size of greenery
-        i = 0
-        while (i < n) and (agreen == 0):
-            for j in range(n):
-                if target * 0.9 <= area[i] + area[j] <= target * 1.1:
-                    if i is not j:
-                        agreen = area[i] + area[j]
-                        greenspace.extend([blocks[i], blocks[j]])
-                        # trick to delete both indices: sort and delete higher first
-                        indices = [i, j]
-                        for index in sorted(indices, reverse=True):
-                            del blocks[index]
-                        print("Two blocks transformed to green space")
-                        # get out of for loop
-                        break
-            i += 1
-
-        # check if any three of the blocks add up to the required size of greenery
-        i = 0
-        while (i < n) and (agreen == 0):
-            for j in range(n):
-                if agreen == 0:
-                    for k in range(n):
-                        if target * 0.9 <= area[i] + area[j] + area[k] <= target * 1.1:
-                            indices = [i, j, k]
-                            indices.sort()
-                            # test that the indices are all different by checking strict order
-                            if indices[0] < indices[1] < indices[2]:
-                                agreen = area[i] + area[j] + area[k]
-                                greenspace.extend([blocks[i], blocks[j], blocks[k]])
-                                # trick to delete both indices: sort and delete highest first
-                                for index in sorted(indices, reverse=True):
-                                    del blocks[index]
-                                print("Three blocks transformed to green space")
-                                # get out of inner for loop
-                                break
-                else:
-                    # get out of outer for loop
-                    break
-            i += 1
-
-        if i == n and agreen == 0:
-            print("Could not find suitable blocks for green space")
-
-        return blocks, greenspace
+        # fix the smallest area of the set, the k - 1 largest areas bound the sum
+        largest = np.sum(areas[n - k + 1:])
+        for i in range(start, n - k + 1):
+            if k * areas[i] > high:
+                break  # all remaining sets are too large
+            if areas[i] + largest < low:
+                continue
+            indices = find_ksum(areas, k - 1, low - areas[i], high - areas[i], start=i + 1)
+            if indices is not None:
+                return [i] + indices
+        return None
+
+
+def find_subset(areas, kmin, kmax, low, high, resolution=1.):
+    """Finds the smallest set of kmin to kmax areas whose sum lies within [low, high].
+    Areas are counted in units of resolution, e.g. the cell area dx * dy, and a table of
+    the reachable sums up to high is filled area by area for all set sizes. Each entry
+    keeps the area that first reached it, so the set is found by walking back through
+    the table. The sum closest to the centre of the interval is returned. Takes
+    O(n * kmax * high / resolution) time and is exact for areas on the grid of resolution.
+    :return: list of indices of the areas, None if there is no such set."""
+
+    units = np.round(np.asarray(areas, dtype=float) / resolution).astype(np.int64)
+    lowunit = max(int(np.ceil(low / resolution - 1e-9)), 0)
+    highunit = int(np.floor(high / resolution + 1e-9))
+    if highunit < lowunit:
+        return None
+
+    size = highunit + 1
+    reach = np.zeros((kmax + 1, size), dtype=bool)
+    reach[0, 0] = True
+    first = np.full((kmax + 1, size), -1, dtype=np.int64)
+    for n, i in enumerate(np.flatnonzero((units > 0) & (units <= highunit))):
+        a = units[i]
+        # larger sets first, such that every area is used at most once
+        for c in range(min(kmax, n + 1), 0, -1):
+            new = reach[c - 1, :size - a] & ~reach[c, a:]
+            np.putmask(first[c, a:], new, i)
+            reach[c, a:] |= new
+
+    centre = (low + high) / 2 / resolution
+    for k in range(kmin, kmax + 1):
+        sums = lowunit + np.flatnonzero(reach[k, lowunit:])
+        if len(sums) == 0:
+            continue
+        total = int(sums[np.argmin(np.abs(sums - centre))])
+        indices = []
+        for c in range(k, 0, -1):
+            indices.append(int(first[c, total]))
+            total -= units[indices[-1]]
+        return indices[::-1]
+    return None
+
+
+def select_greenery(areas, target, tolerance=0.1, kmax=3, resolution=1.):
+    """Selects the smallest set of at most kmax blocks whose total area is within
+    target * (1 +- tolerance). Sets of up to 3 blocks are searched in the sorted
+    areas with find_ksum, larger sets with the table of find_subset.
+    :param areas: block plan areas.
+    :param target: target green area.
+    :param tolerance: relative tolerance of the green area, default is 10%.
+    :param kmax: maximum number of blocks that are converted, default is 3.
+    :param resolution: area unit of the search for more than 3 blocks, e.g. dx * dy.
+    :return: dictionary with the block indices, number of blocks, green area,
+        target and whether a suitable set of blocks was found."""
+
+    areas = np.asarray(areas, dtype=float)
+    selection = {'indices': np.zeros(0, dtype=int),
+                 'nblocks': 0,
+                 'area': 0.,
+                 'target': target,
+                 'found': target == 0}
+
+    if target == 0:
+        return selection
+
+    order = np.argsort(areas, kind='stable')
+    sortedareas = areas[order]
+    low = target * (1 - tolerance)
+    high = target * (1 + tolerance)
+
+    indices = None
+    for k in range(1, min(kmax, 3) + 1):
+        indices = find_ksum(sortedareas, k, low, high)
+        if indices is not None:
+            break
+    if indices is None and kmax > 3:
+        indices = find_subset(sortedareas, 4, kmax, low, high, resolution)
+
+    if indices is not None:
+        indices = np.sort(order[indices])
+        selection['indices'] = indices
+        selection['nblocks'] = len(indices)
+        selection['area'] = np.sum(areas[indices])
+        selection['found'] = True
+
+    return selection
+
+
+def convert_blocks_to_greenery(blocks, target, tolerance=0.1, kmax=3, resolution=1.):
+    """Function to convert target surface of blocks into green space.
+    Converts the smallest number of blocks, up to kmax, with a total area
+    within target * (1 +- tolerance), see select_greenery.
+    :return: remaining blocks, green space and the selection dictionary."""
+
+    blocks = asblockarray(blocks)
+    selection = select_greenery(blocks.plans, target, tolerance, kmax, resolution)
+
+    green = np.zeros(len(blocks), dtype=bool)
+    green[selection['indices']] = True
+    greenspace = blocks[green]
+
+    return blocks[~green], greenspace, selection
@@ -1,83 +1,172 @@
 import numpy as np
-import copy
 from . import utils
 from . import randomiser
+from .blocks import asblockarray
+from .history import History
 
 
 def uniform(blocks, height):
-    blocks3d = []
-    for block in blocks:
-        xy = [b for b in block[0:4]]
-        z = [0, height]
-        blocks3d.append(xy + z)
+    blocks3d = asblockarray(blocks).extrude(height)
 
     return blocks3d
 
 
 def heightlist(blocks, heights):
-    blocks3d = []
-    for block, height in zip(blocks, heights):
-        xy = [b for b in block[0:4]]
-        z = [0, height]
-        blocks3d.append(xy + z)
+    blocks3d = asblockarray(blocks).extrude(heights)
 
     return blocks3d
 
 
-def generate_heights(blocks, target, randomness=0., maxheight=50, minvolume=None, delta=1, savesteps=False):
+def minimum_heights(blocks, randomness=0., minvolume=None):
+    """Returns the lowest height of each block, such that blocks have at least the
+    volume of a cube with edge minvolume. Without randomness all blocks get the
+    largest of these heights.
+    :param minvolume: dimensional parameter, None for no minimum height."""
+    blocks = asblockarray(blocks)
+    if minvolume is None:
+        return np.zeros(len(blocks))
+    zmins = np.round(minvolume**3/blocks.plans)
+    if randomness == 0.:
+        # set minimum volume same for all blocks
+        zmins = np.full(len(blocks), np.max(zmins, initial=0))
+    return zmins
+
+
+def solve_heights(blocks, target, randomness=0., maxheight=50, minvolume=None, delta=1, distribution=None, seed=None):
+    """Assigns heights that reach a frontal area target in one pass.
+    Relative heights are drawn per block and scaled by a common factor, where the
+    heights are clipped to the minimum heights and maxheight, like water filling.
+    Heights are capped at the highest increment of delta above the minimum heights
+    that does not exceed maxheight. The factor is found by bisection, then the
+    heights are rounded down to increments of delta above the minimum heights and
+    one delta is added to the blocks with the largest remainders, until the frontal
+    area is closest to the target. The frontal area then differs from the target by
+    at most half an increment of delta of the widest block.
+    :param randomness: degree of randomness of the relative heights, which are 1
+        with probability (1 - r) and uniform in (0, 2) with probability r.
+    :param distribution: function that draws relative heights instead, called as
+        distribution(rng, n), e.g. lambda rng, n: rng.lognormal(0, 0.5, n).
+    :param seed: None, an integer or a numpy random generator.
+    :return: 3D blocks."""
+    blocks = asblockarray(blocks)
+    rng = randomiser.get_rng(seed)
+    n = len(blocks)
+    widths = blocks.widths
+    lowest = minimum_heights(blocks, randomness, minvolume)
+    # highest heights on the grid of increments above the minimum heights
+    nsteps = np.floor((np.maximum(lowest, maxheight) - lowest) / delta)
+    highest = lowest + nsteps * delta
+
+    # the target is reached between the minimum heights and all blocks at maxheight
+    low = np.sum(widths * lowest)
+    high = np.sum(widths * highest)
+    if target <= low:
+        if target < low:
+            print("Warning: frontal area of the minimum heights is above the target.")
+        return blocks.extrude(lowest)
+    if target >= high:
+        if target > high:
+            print("Warning: frontal area target cannot be reached below the maximum height.")
+        return blocks.extrude(highest)
+
+    if distribution is None:
+        relative = np.where(rng.random(n) < randomness, 2 * rng.random(n), 1.)
+    else:
+        relative = np.asarray(distribution(rng, n), dtype=float)
+    relative = np.maximum(relative, 1e-9 * np.amax(relative, initial=1.))
+
+    # frontal area grows monotonically with the scale of the relative heights
+    def front(scale):
+        return np.sum(widths * np.clip(scale * relative, lowest, highest))
+
+    smin, smax = 0., np.amax(highest / relative)
+    for _ in range(100):
+        scale = (smin + smax) / 2
+        if front(scale) < target:
+            smin = scale
+        else:
+            smax = scale
+    heights = np.clip(smax * relative, lowest, highest)
+
+    # round to increments of delta and add increments by largest remainder
+    increments = np.minimum((heights - lowest) / delta, nsteps)
+    steps = np.floor(increments)
+    room = steps < nsteps
+    order = np.argsort(steps - increments, kind='stable')
+    order = order[room[order]]
+    fronts = np.sum(widths * (lowest + steps * delta)) + np.concatenate([[0.], np.cumsum(widths[order] * delta)])
+    k = np.searchsorted(fronts, target)
+    if k == len(fronts) or (k > 0 and target - fronts[k - 1] <= fronts[k] - target):
+        k -= 1
+    steps[order[:k]] += 1
+
+    return blocks.extrude(lowest + steps * delta)
+
+
+def generate_heights(blocks, target, randomness=0., maxheight=50, minvolume=None, delta=1, savesteps=False, seed=None,
+                     method="grow", distribution=None):
     # minvolume is dimensional parameter
+    # method 'grow' adds increments to the blocks in turn until the target is reached,
+    # method 'solve' assigns all heights at once with solve_heights, which can use a distribution
+    blocks = asblockarray(blocks)
+    sampler = randomiser.Sampler(randomness, seed)
     
-    generationsteps = []
-    # to save intermediate layouts
+    # to save intermediate layouts as events, see history.History
+    generationsteps = History()
     if savesteps is True:
-        generationsteps.append(copy.deepcopy(blocks))
+        generationsteps.add(blocks)
+        generationsteps.step(4)
 
-    if target is 0:
+    if target == 0:
         blocks3d = uniform(blocks, 1*delta)
-    else:
+    elif method in ["solve", "s"]:
+        blocks3d = solve_heights(blocks, target, randomness, maxheight, minvolume, delta, distribution, sampler.rng)
+    elif method in ["grow", "g"]:
         # make a volume check to avoid too small blocks
-        if minvolume is not None:
-            zmins = []
-            for block in blocks:
-                zmin = round(minvolume**3/((block[1] - block[0])*(block[3] - block[2])))
-                zmins.append(zmin)
-
-            if randomness == 0.:
-                # set minimum volume same for all blocks
-                minheight = max(zmins)
-                blocks3d = uniform(blocks, minheight)
-            else:
-                blocks3d = heightlist(blocks, zmins)
+        blocks3d = heightlist(blocks, minimum_heights(blocks, randomness, minvolume))
                 
         hblocks = utils.blockfront(blocks3d)
         
         # to save intermediate layouts
         if savesteps is True:
-            generationsteps.append(copy.deepcopy(blocks3d))
+            generationsteps.height(np.arange(len(blocks3d)), blocks3d.zmin, blocks3d.zmax)
+            generationsteps.step(6)
 
-        n = len(blocks)
-        j = 0
         #  add height for as long as blocks are below lf
+        #  blocks grow in rounds over all blocks, the increments of a round are drawn at once
+        #  and the frontal area is updated by the increments until the target is reached
+        widths = blocks3d.widths
         while hblocks < target:
-            # adjust maximum height
-            currentheight = blocks3d[j][5]
-            cap = maxheight - currentheight
-            # if block has not reached maximum height
-            if cap > 1:
-                interval = np.arange(delta, cap + delta, delta)
-                blocks3d[j][5] += randomiser.draw_from_interval(interval, randomness, weight='low')
-            hblocks = utils.blockfront(blocks3d)
-            
-            # to save intermediate layouts
-            if savesteps is True:
-                generationsteps.append(copy.deepcopy(blocks3d))
+            # adjust maximum height, only blocks that have not reached it grow
+            cap = maxheight - blocks3d.zmax
+            grow = np.flatnonzero(cap > 1)
+            if len(grow) == 0:
+                print("Warning: all blocks reached the maximum height, frontal area target not reached.")
+                break
+            increments = sampler.draw_ranges(delta, cap[grow], delta, weight='low')
 
+            # blocks of this round up to the increment that reaches the target
+            fronts = hblocks + np.cumsum(widths[grow] * increments)
+            last = min(np.searchsorted(fronts, target), len(grow) - 1)
+            grow, increments = grow[:last + 1], increments[:last + 1]
+            blocks3d.data[grow, 5] += increments
+            hblocks = fronts[last]
+            if hblocks >= target:
+                # final check against the full sum, the running total may drift
+                hblocks = utils.blockfront(blocks3d)
 
-            j += 1
-            j %= n
+            # to save intermediate layouts
+            if savesteps is True:
+                for j in grow:
+                    generationsteps.height(j, blocks3d[j][4], blocks3d[j][5])
+                    generationsteps.step(6)
+    else:
+        raise ValueError("The input method could not be found."
+                         "Options for method are: 'grow' and 'solve'.")
             
     # to save intermediate layouts
     if savesteps is True:
-        generationsteps.append(copy.deepcopy(blocks3d))
+        generationsteps.height(np.arange(len(blocks3d)), blocks3d.zmin, blocks3d.zmax)
+        generationsteps.step(6)
 
     return blocks3d, generationsteps
@@ -0,0 +1,148 @@
+import numpy as np
+from .blocks import BlockArray
+
+
+# event kinds
+ADD = 0  # add a block in the next slot
+REMOVE = 1  # remove the block of a slot
+HEIGHT = 2  # set zmin and zmax of the block of a slot
+
+EVENT = np.dtype([('kind', np.int8),
+                  ('slot', np.int32),
+                  ('values', np.float64, 6)])
+
+
+class History:
+    """Generation history of a layout stored as a log of events.
+    Every created block gets a slot. Events add blocks, remove blocks (split or
+    converted to greenery) or set block heights, and the events are grouped into
+    steps. The layout of a step consists of all blocks that were added and not
+    removed until this step, in the order of their slots.
+    Layouts are reconstructed on demand: history[k] returns step k and iterating
+    over the history yields the layouts of all steps, such that a history can be
+    used wherever a list of generation steps is expected."""
+
+    def __init__(self):
+        self._events = np.zeros(0, dtype=EVENT)
+        self.nevents = 0
+        self.nslots = 0
+        self.stepends = []  # number of events up to and including each step
+        self.stepcols = []  # 4 for 2D layouts, 6 for 3D layouts
+
+    def __len__(self):
+        return len(self.stepends)
+
+    @property
+    def events(self):
+        """Structured array of all recorded events."""
+        return self._events[:self.nevents]
+
+    def _record(self, kind, slots, values):
+        slots = np.atleast_1d(slots)
+        m = len(slots)
+        if self.nevents + m > len(self._events):
+            events = np.zeros(max(self.nevents + m, 2 * len(self._events), 64), dtype=EVENT)
+            events[:self.nevents] = self.events
+            self._events = events
+        new = self._events[self.nevents:self.nevents + m]
+        new['kind'] = kind
+        new['slot'] = slots
+        new['values'] = values
+        self.nevents += m
+
+    def add(self, blocks):
+        """Records new blocks, which get the next free slots."""
+        blocks = BlockArray(blocks, ncols=6)
+        slots = np.arange(self.nslots, self.nslots + len(blocks))
+        self._record(ADD, slots, blocks.data)
+        self.nslots += len(blocks)
+        return slots
+
+    def remove(self, slots):
+        """Records the removal of the blocks in the given slots."""
+        self._record(REMOVE, slots, 0.)
+
+    def height(self, slots, zmin, zmax):
+        """Records new heights of the blocks in the given slots."""
+        values = np.zeros((len(np.atleast_1d(slots)), 6))
+        values[:, 4] = zmin
+        values[:, 5] = zmax
+        self._record(HEIGHT, slots, values)
+
+    def step(self, ncols=4):
+        """Closes the current step.
+        :param ncols: 4 if the layout of the step is 2D, 6 if it is 3D."""
+        self.stepends.append(self.nevents)
+        self.stepcols.append(ncols)
+
+    def extend(self, other, slots):
+        """Appends the steps of the history of a subset of the blocks,
+        for example the history of generate_heights.
+        :param other: History whose first len(slots) added blocks are the given slots of
+            this history. Their add events are dropped, all other slots are remapped."""
+        slots = np.asarray(slots, dtype=np.int64)
+        events = other.events.copy()
+        mapping = np.concatenate([slots, np.arange(self.nslots, self.nslots + other.nslots - len(slots))])
+        keep = ~((events['kind'] == ADD) & (events['slot'] < len(slots)))
+        events['slot'] = mapping[events['slot']]
+
+        # number of kept events up to each step of the other history
+        kept = np.concatenate([[0], np.cumsum(keep)])
+        ends = kept[np.asarray(other.stepends, dtype=np.int64)] + self.nevents
+        new = events[keep]
+        if self.nevents + len(new) > len(self._events):
+            merged = np.zeros(self.nevents + len(new), dtype=EVENT)
+            merged[:self.nevents] = self.events
+            self._events = merged
+        self._events[self.nevents:self.nevents + len(new)] = new
+        self.nevents += len(new)
+        self.nslots += other.nslots - len(slots)
+        self.stepends.extend(ends.tolist())
+        self.stepcols.extend(other.stepcols)
+
+    def _state(self, nevents):
+        # blocks of all slots and slots in use after a number of events
+        events = self.events[:nevents]
+        blocks = np.zeros((self.nslots, 6))
+        used = np.zeros(self.nslots, dtype=bool)
+
+        adds = events[events['kind'] == ADD]
+        blocks[adds['slot']] = adds['values']
+        used[adds['slot']] = True
+        used[events['slot'][events['kind'] == REMOVE]] = False
+
+        # the last height event of each slot sets its height
+        heights = events[events['kind'] == HEIGHT][::-1]
+        slots, last = np.unique(heights['slot'], return_index=True)
+        blocks[slots, 4:6] = heights['values'][last, 4:6]
+
+        return blocks, used
+
+    def __getitem__(self, k):
+        """Reconstructs the layout of step k."""
+        if not -len(self) <= k < len(self):
+            raise IndexError("Step index out of range.")
+        k %= len(self)
+        blocks, used = self._state(self.stepends[k])
+
+        return BlockArray(blocks[used], ncols=self.stepcols[k])
+
+    def __iter__(self):
+        return self.snapshots()
+
+    def snapshots(self, start=0, stop=None):
+        """Generator that yields the layouts of steps start to stop,
+        replaying the events step by step from the layout before start."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        begin = self.stepends[start - 1] if start > 0 else 0
+        blocks, used = self._state(begin)
+        for k in range(start, stop):
+            events = self.events[begin:self.stepends[k]]
+            begin = self.stepends[k]
+            adds = events[events['kind'] == ADD]
+            blocks[adds['slot']] = adds['values']
+            used[adds['slot']] = True
+            used[events['slot'][events['kind'] == REMOVE]] = False
+            heights = events[events['kind'] == HEIGHT]
+            blocks[heights['slot'], 4:6] = heights['values'][:, 4:6]
+            yield BlockArray(blocks[used], ncols=self.stepcols[k])
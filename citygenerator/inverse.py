@@ -0,0 +1,119 @@
+import numpy as np
+from . import utils
+from .ensemble import generate_ensemble, spawn_seeds
+
+
+# SUPPORT FUNCTIONS FOR INVERSE DESIGN
+# -----------
+
+def correct_parameter(history, target, lower=0.01, upper=0.99):
+    """Returns the generator parameter that is expected to give the target density.
+    With one batch, the parameter is scaled by target / mean density.
+    With more batches, a linear fit of the mean densities of the last three batches
+    against the parameter is solved for the target.
+    :param history: list of (parameter, mean density) of previous batches.
+    :param target: target density.
+    :param lower, upper: bounds of the parameter."""
+
+    x = np.array([h[0] for h in history])
+    y = np.array([h[1] for h in history])
+
+    new = None
+    if len(history) > 1 and np.ptp(x[-3:]) > 0:
+        slope, intercept = np.polyfit(x[-3:], y[-3:], 1)
+        if slope > 0:
+            new = (target - intercept) / slope
+    if new is None:
+        new = x[-1] * target / y[-1] if y[-1] > 0 else 2 * x[-1]
+
+    return float(np.clip(new, lower, upper))
+
+
+def score_layouts(blocks, a0):
+    """Returns the plan and frontal area densities of a batch of layouts."""
+    table = utils.blockstats_table(blocks, a0=a0)
+    return table['planindex'], table['frontindex']
+
+
+# -----------
+# MAIN INVERSE DESIGN FUNCTION
+
+def find_layout(target_lp, target_lf, params, tol=0.01, budget=200, batchsize=8,
+                workers=1, seed=None, adapt_randomness=False):
+    """Searches generator parameters for a layout with target plan area density
+    lambda_p and frontal area density lambda_f.
+    Layouts are generated in batches. After every batch, pbuild and pfrontal are
+    corrected with a linear surrogate of the mean batch densities (see
+    correct_parameter), which compensates the systematic overshoot of the generator.
+    :param target_lp: target plan area density.
+    :param target_lf: target frontal area density.
+    :param params: dictionary of keyword arguments for generate_layout, without
+        pbuild and pfrontal.
+    Optional:
+    :param tol: absolute tolerance of both densities, default is 0.01.
+    :param budget: maximum number of generated layouts.
+    :param batchsize: number of layouts per batch.
+    :param workers: number of worker processes, see generate_ensemble.
+    :param seed: master seed for all batches.
+    :param adapt_randomness: if True, the layout and height randomness are reduced
+        by 20% when the batch means are within tolerance but no layout is, to reduce
+        the spread of the densities.
+    :return: dictionary with the blocks, greenspace, statistics and parameters of the
+        closest layout of the first batch with a layout within tolerance, or of the
+        closest layout of all batches if the budget is used.
+        'found' tells whether the layout is within tolerance."""
+
+    if "pbuild" in params or "pfrontal" in params:
+        raise ValueError("Parameters cannot contain pbuild and pfrontal, they are searched.")
+
+    params = dict(params)
+    a0 = params["xsize"] * params["ysize"]
+    pbuild = target_lp
+    pfrontal = target_lf
+    lphistory = []
+    lfhistory = []
+
+    # one seed per possible batch, so that results do not depend on the batch size
+    seeds = spawn_seeds(max(1, -(-budget // batchsize)), seed)
+    best = None
+    ngenerated = 0
+
+    for batchseed in seeds:
+        n = min(batchsize, budget - ngenerated)
+        if n <= 0:
+            break
+        trial = dict(params, pbuild=pbuild, pfrontal=pfrontal)
+        blocks, greenspace = generate_ensemble(n, trial, workers=workers, seed=batchseed)
+        ngenerated += n
+
+        lp, lf = score_layouts(blocks, a0)
+        error = np.maximum(np.abs(lp - target_lp), np.abs(lf - target_lf))
+        i = int(np.argmin(error))
+        if best is None or error[i] < best['error']:
+            best = {'blocks': blocks[i],
+                    'greenspace': greenspace[i],
+                    'planindex': lp[i],
+                    'frontindex': lf[i],
+                    'error': error[i],
+                    'params': trial}
+
+        if best['error'] <= tol:
+            break
+
+        # correct parameters with the batch means
+        lphistory.append((pbuild, np.mean(lp)))
+        lfhistory.append((pfrontal, np.mean(lf)))
+        pbuild = correct_parameter(lphistory, target_lp,
+                                   upper=0.99 - params.get("pgreen", 0))
+        pfrontal = correct_parameter(lfhistory, target_lf, upper=10.)
+
+        if adapt_randomness:
+            meanerror = max(abs(np.mean(lp) - target_lp), abs(np.mean(lf) - target_lf))
+            if meanerror <= tol:
+                params["layoutrandom"] = 0.8 * params.get("layoutrandom", 0.)
+                params["heightrandom"] = 0.8 * params.get("heightrandom", 0.)
+
+    best['found'] = bool(best['error'] <= tol)
+    best['ngenerated'] = ngenerated
+
+    return best
@@ -1,63 +1,110 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from matplotlib import colormaps
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba_array
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+from .blocks import BlockArray, asblockarray
+from .raster import paint
 
 
-# SUPPORT FUNCTIONS FOR 3D BLOCK PLOTS
+# SUPPORT FUNCTIONS FOR BLOCK PLOTS
 # -----------
 
+# block columns [xmin, xmax, ymin, ymax, zmin, zmax] of the 8 block vertices
+VERTEX_COLUMNS = np.array([[0, 2, 4],
+                           [0, 2, 5],
+                           [0, 3, 4],
+                           [0, 3, 5],
+                           [1, 2, 4],
+                           [1, 2, 5],
+                           [1, 3, 4],
+                           [1, 3, 5]])
+
+# vertex indices of the 6 block faces
+FACE_VERTICES = np.array([[0, 1, 3, 2],
+                          [2, 3, 7, 6],
+                          [6, 7, 5, 4],
+                          [4, 5, 1, 0],
+                          [1, 3, 7, 5],
+                          [0, 2, 6, 4]])
+
+# outward normals of the 6 block faces
+FACE_NORMALS = np.array([[-1, 0, 0],
+                         [0, 1, 0],
+                         [1, 0, 0],
+                         [0, -1, 0],
+                         [0, 0, 1],
+                         [0, 0, -1]])
+
+# default view of 3D plots, elevation and azimuth in degrees
+VIEW = (25, 235)
+
+
+def footprints(blocks):
+    """Returns the corners of all block footprints as array of shape (N, 4, 2)."""
+    blocks = asblockarray(blocks)
+    footprints = blocks.data[:, [[0, 2], [1, 2], [1, 3], [0, 3]]]
+
+    return footprints
+
+
 def vertices(blocks):
-    vertices = []
-    for block in blocks:
-        x = block[0:2]
-        y = block[2:4]
-        z = block[4:6]
-        verts = [[x[0], y[0], z[0]], 
-                [x[0], y[0], z[1]],
-                [x[0], y[1], z[0]],
-                [x[0], y[1], z[1]], 
-                [x[1], y[0], z[0]],
-                [x[1], y[0], z[1]],
-                [x[1], y[1], z[0]], 
-                [x[1], y[1], z[1]]]
-        vertices.append(verts)
+    """Returns the vertices of all blocks as array of shape (N, 8, 3)."""
+    blocks = asblockarray(blocks)
+    vertices = blocks.data[:, VERTEX_COLUMNS]
 
     return vertices
 
 
 def faces(blocks):
+    """Returns the faces of all blocks as array of shape (N, 6, 4, 3)."""
 
     verts = vertices(blocks)
-    faces = []
-    for v in verts:
-        face = [[v[0], v[1], v[3], v[2]],
-               [v[2], v[3], v[7], v[6]],
-               [v[6], v[7], v[5], v[4]],
-               [v[4], v[5], v[1], v[0]],
-               [v[1], v[3], v[7], v[5]],
-               [v[0], v[2], v[6], v[4]]]
-        faces.append(face)
+    faces = verts[:, FACE_VERTICES]
         
     return faces
 
 
+def visible_faces(elev=VIEW[0], azim=VIEW[1]):
+    """Returns the indices of the block faces that point towards the viewer.
+    The bottom faces and the faces on the far side of the blocks are hidden for
+    all blocks, as the outward normals of the faces are the same for all blocks."""
+    elev, azim = np.radians(elev), np.radians(azim)
+    eye = np.array([np.cos(elev)*np.cos(azim), np.cos(elev)*np.sin(azim), np.sin(elev)])
+    visible = (FACE_NORMALS @ eye > 1e-9) & (FACE_NORMALS[:, 2] >= 0)
+
+    return np.flatnonzero(visible)
+
+
+def polygons(blocks, elev=VIEW[0], azim=VIEW[1], cull=True):
+    """Returns the faces of all blocks as one array of polygons of shape (N*k, 4, 3),
+    with the k faces of block i in rows i*k to (i+1)*k.
+    :param cull: only return the faces that are visible from the view."""
+    fas = faces(blocks)
+    if cull is True:
+        fas = fas[:, visible_faces(elev, azim)]
+
+    return fas.reshape(-1, 4, 3)
+
+
 # -----------
 # MAIN PLOTTING FUNCTIONS
 
 def plot_2dlayout(blocks, ax=None, limits=None, **kwargs):
     # block in blocks has form [xmin, xmax, ymin, ymax, ...]
     # limits are plot limits and has form [xmin, xmax, ymin, ymax]
+    # facecolor and edgecolor can be one colour or one colour per block
     
+    blocks = asblockarray(blocks)
     if ax is None:
         ax = plt.axes()
 
-    for block in blocks:
-        start = tuple([block[0], block[2]])  # xmin, ymin
-        width = block[1] - block[0]  # xmax - xmin
-        height = block[3] - block[2]  # ymax - ymin
-        p = patches.Rectangle(start, width, height, **kwargs)
-        ax.add_patch(p)
+    # all footprints are drawn as a single PolyCollection
+    if kwargs.pop('fill', True) is False:
+        kwargs['facecolor'] = 'none'
+    collection = PolyCollection(footprints(blocks), **kwargs)
+    ax.add_collection(collection)
 
     if limits is None:
         ax.autoscale()
@@ -74,22 +121,31 @@ def plot_2dlayout(blocks, ax=None, limits=None, **kwargs):
     return
 
 
-def plot_3dlayout(blocks, ax=None, limits=None, **kwargs):
+def plot_3dlayout(blocks, ax=None, limits=None, cull=True, **kwargs):
+    # all blocks are drawn as a single Poly3DCollection,
+    # facecolor can be one colour or one colour per block
+    # cull=True hides the faces that cannot be seen from the default view
     
+    blocks = asblockarray(blocks)
     if ax is None:
         ax = plt.axes(projection='3d')
         
     if limits is None:  # need to set some limits otherwise we cannot see anything
-        xmax = np.amax([block[1] for block in blocks])
-        ymax = np.amax([block[3] for block in blocks])
-        zmax = np.amax([block[5] for block in blocks])
+        xmax = np.amax(blocks.xmax)
+        ymax = np.amax(blocks.ymax)
+        zmax = np.amax(blocks.zmax)
         limits = [0, xmax, 0, ymax, 0, 3*zmax]
-        
-    fas = faces(blocks)
 
-    for sides in fas:
-        collection = Poly3DCollection(sides, **kwargs)
-        ax.add_collection3d(collection)
+    polys = polygons(blocks, *VIEW, cull=cull)
+    nfaces = len(polys) // max(len(blocks), 1)
+    for key in ['facecolor', 'facecolors', 'color']:
+        if key in kwargs and len(blocks) > 1:
+            colors = to_rgba_array(kwargs[key])
+            if len(colors) == len(blocks):
+                kwargs[key] = np.repeat(colors, nfaces, axis=0)
+
+    collection = Poly3DCollection(polys, **kwargs)
+    ax.add_collection3d(collection)
     
     ax.set_xlim(limits[0:2])
     ax.set_ylim(limits[2:4])
@@ -98,19 +154,99 @@ def plot_3dlayout(blocks, ax=None, limits=None, **kwargs):
     ax.yaxis.set_ticks(np.linspace(*limits[2:4], 5))
     ax.zaxis.set_ticks(np.linspace(*limits[4:6], 4))
         
-    ax.w_xaxis.set_pane_color((1.0, 1.0, 1.0, 0.05))
-    ax.w_yaxis.set_pane_color((1.0, 1.0, 1.0, 0.05))
-    ax.w_zaxis.set_pane_color((1.0, 1.0, 1.0, 0.05))
+    ax.xaxis.set_pane_color((1.0, 1.0, 1.0, 0.05))
+    ax.yaxis.set_pane_color((1.0, 1.0, 1.0, 0.05))
+    ax.zaxis.set_pane_color((1.0, 1.0, 1.0, 0.05))
 
     ax.set_xlabel('x')
     ax.set_ylabel('y')
     ax.set_zlabel('z')
     
     ax.set_aspect('equal')
-    ax.view_init(25, 235)
+    ax.view_init(*VIEW)
     
-    plt.gca().patch.set_facecolor('none')  # set figure background
+    ax.patch.set_facecolor('none')  # set figure background
 
     return
 
 
+# -----------
+# RASTER IMAGES
+
+def rasterize(blocks, pixelsize=1., limits=None):
+    """Paints the blocks into a height map without matplotlib, see raster.paint.
+    A pixel belongs to a block if its centre lies in the block footprint.
+    :param blocks: 2D or 3D blocks, 2D blocks have height 0.
+    :param pixelsize: pixel size in metres.
+    :param limits: painted area [xmin, xmax, ymin, ymax], default is from 0 to the
+        largest block coordinates.
+    :return: height map of shape (ny, nx), row 0 is the lowest y."""
+    blocks = BlockArray(blocks, ncols=6)
+    if limits is None:
+        limits = [0, np.amax(blocks.xmax, initial=0), 0, np.amax(blocks.ymax, initial=0)]
+    nx = max(int(np.ceil((limits[1] - limits[0]) / pixelsize)), 1)
+    ny = max(int(np.ceil((limits[3] - limits[2]) / pixelsize)), 1)
+
+    # the same cells as the voxels of the LES grid, in rows of y
+    heightmap = paint(blocks, blocks.heights, nx, ny, pixelsize, pixelsize, limits[0:4:2]).T
+
+    return heightmap
+
+
+def thumbnail(blocks, greenery=(), pixelsize=1., limits=None, vmax=None, cmap='viridis',
+              background=(1., 1., 1.), green=(0., 0.5, 0.)):
+    """Returns an RGB image of a layout with blocks coloured by height.
+    :param greenery: green blocks, painted in the colour green.
+    :param vmax: height of the top colour of the colour map, default is the largest height.
+    :param background: colour of the streets.
+    :return: uint8 array of shape (ny, nx, 3), row 0 is the largest y as in image files."""
+    blocks = BlockArray(blocks, ncols=6)
+    if limits is None:
+        limits = [0, np.amax(blocks.xmax, initial=0), 0, np.amax(blocks.ymax, initial=0)]
+    if vmax is None:
+        vmax = np.amax(blocks.heights, initial=0)
+
+    heightmap = rasterize(blocks, pixelsize, limits)
+    built = rasterize(blocks.extrude(1.), pixelsize, limits) > 0
+    greens = rasterize(BlockArray(greenery, ncols=6).extrude(1.), pixelsize, limits) > 0
+
+    image = np.empty(heightmap.shape + (3,))
+    image[...] = background
+    image[built] = colormaps[cmap](heightmap[built] / max(vmax, 1e-12))[:, :3]
+    image[greens] = green
+
+    return np.round(255 * image[::-1]).astype(np.uint8)
+
+
+def contact_sheet(layouts, greenery=None, ncols=10, pixelsize=1., limits=None, padding=2,
+                  vmax=None, cmap='viridis', background=(1., 1., 1.)):
+    """Tiles the thumbnails of many layouts into one RGB image, row by row.
+    All thumbnails share the same limits and colour scale, so that they can be compared.
+    The image can be saved with matplotlib.pyplot.imsave.
+    :param layouts: list of layouts or BlockBatch, for example of an ensemble.
+    :param greenery: list or BlockBatch of the green blocks of each layout.
+    :param ncols: number of thumbnails per row.
+    :param padding: number of background pixels between thumbnails.
+    :return: uint8 array of shape (height, width, 3)."""
+    layouts = [BlockArray(blocks, ncols=6) for blocks in layouts]
+    if greenery is None:
+        greenery = [()] * len(layouts)
+    if limits is None:
+        limits = [0, max([np.amax(b.xmax, initial=0) for b in layouts], default=0),
+                  0, max([np.amax(b.ymax, initial=0) for b in layouts], default=0)]
+    if vmax is None:
+        vmax = max([np.amax(b.heights, initial=0) for b in layouts], default=0)
+
+    nrows = max(int(np.ceil(len(layouts) / ncols)), 1)
+    ncols = min(ncols, max(len(layouts), 1))
+    ny, nx = rasterize(BlockArray(ncols=4), pixelsize, limits).shape
+    sheet = np.empty((nrows * (ny + padding) + padding, ncols * (nx + padding) + padding, 3), dtype=np.uint8)
+    sheet[...] = np.round(255 * np.asarray(background)).astype(np.uint8)
+
+    for k, (blocks, green) in enumerate(zip(layouts, greenery)):
+        row, col = divmod(k, ncols)
+        y = padding + row * (ny + padding)
+        x = padding + col * (nx + padding)
+        sheet[y:y + ny, x:x + nx] = thumbnail(blocks, green, pixelsize, limits, vmax, cmap, background)
+
+    return sheet
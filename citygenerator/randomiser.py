@@ -43,6 +43,114 @@ def lowpoint(interval):
     return lowest
 
 
+def default_index(nvalues, weight='mid'):
+    """Function that returns the index of the default point of intervals.
+    :param nvalues: number of points of the interval(s), integer or array
+    :param weight: 'mid' for the mid point, 'low' for the lowest point."""
+
+    if weight in ['mid', 'm', 'centre']:
+        index = np.floor_divide(nvalues, 2)  # lower value in case of odd number of values
+    elif weight in ['low', 'l', 'min']:
+        index = np.zeros_like(nvalues)
+    else:
+        raise ValueError("The weight point of interval could not be found."
+                         "Options for order are: 'mid', 'low'.")
+
+    return index
+
+
+def get_rng(seed=None):
+    """Function that returns a NumPy random generator.
+    :param seed: None, integer, SeedSequence or Generator.
+        If None, the generator is seeded from Python's random module,
+        such that random.seed() gives reproducible results."""
+
+    if seed is None:
+        seed = random.getrandbits(128)
+
+    return np.random.default_rng(seed)
+
+
+class Sampler:
+    """Draws points from the distribution defined in density_function in O(1).
+    The default point of an interval is drawn with probability (1 - r), 
+    and a uniformly distributed point of the interval with probability r.
+    Intervals of evenly spaced points are cached by (low, high, delta).
+    :param randomness: degree of randomisation, 0 <= randomness <= 1.
+    :param rng: NumPy random generator or seed, see get_rng."""
+
+    def __init__(self, randomness=0., rng=None):
+        if not 0. <= randomness <= 1.:
+            raise ValueError("Degree of randomness must be between 0 and 1.")
+        self.randomness = randomness
+        self.rng = get_rng(rng)
+        self.intervals = {}
+
+    def interval(self, low, high, delta=1):
+        """Returns the cached interval of points from low to high with spacing delta."""
+        key = (low, high, delta)
+        if key not in self.intervals:
+            self.intervals[key] = np.arange(low, high + delta, delta)
+        return self.intervals[key]
+
+    def indices(self, nvalues, weight='mid', size=None):
+        """Draws indices of points from intervals with nvalues points.
+        :param nvalues: number of points, integer or array of integers
+        :param weight: default point that is drawn with probability (1 - r)
+        :param size: number of draws, default is one draw per interval"""
+
+        nvalues = np.asarray(nvalues)
+        if size is None:
+            size = nvalues.shape
+        if np.any(nvalues < 1):
+            raise ValueError("Cannot draw from an empty interval.")
+        index = default_index(nvalues, weight) * np.ones(size, dtype=int)
+        if self.randomness > 0.:
+            randomised = self.rng.random(size) < self.randomness
+            uniform = self.rng.integers(0, nvalues, size=size)
+            index = np.where(randomised, uniform, index)
+
+        return index
+
+    def draw(self, interval, weight='mid'):
+        """Draws a single point from a given interval."""
+        nvalues = len(interval)
+        if nvalues < 1:
+            raise ValueError("Cannot draw from an empty interval.")
+        if self.randomness > 0. and self.rng.random() < self.randomness:
+            return interval[self.rng.integers(nvalues)]
+
+        return interval[default_index(nvalues, weight)]
+
+    def draws(self, interval, size, weight='mid'):
+        """Draws an array of points from a given interval."""
+        interval = np.asarray(interval)
+
+        return interval[self.indices(len(interval), weight, size)]
+
+    def draw_range(self, low, high, delta=1, weight='mid'):
+        """Draws a single point from the evenly spaced points from low to high,
+        the same points as in np.arange(low, high + delta, delta), 
+        without creating the interval."""
+        # number of points as computed by np.arange
+        nvalues = math.ceil((high + delta - low) / delta)
+        if nvalues < 1:
+            raise ValueError("Cannot draw from an empty interval.")
+        if self.randomness > 0. and self.rng.random() < self.randomness:
+            return low + self.rng.integers(nvalues) * delta
+
+        return low + default_index(nvalues, weight) * delta
+
+    def draw_ranges(self, low, high, delta=1, weight='mid'):
+        """Draws one point per range from evenly spaced points from low to high,
+        like draw_range for arrays of bounds, in one vectorised draw."""
+        low = np.asarray(low)
+        # number of points as computed by np.arange
+        nvalues = np.ceil((np.asarray(high) + delta - low) / delta).astype(np.int64)
+
+        return low + self.indices(nvalues, weight) * delta
+
+
 def draw_from_interval(interval, randomness=0., weight='mid'):
     """Function that returns a random point from a given set. 
     :param interval: given set of points
@@ -62,9 +170,15 @@ def draw_from_interval(interval, randomness=0., weight='mid'):
     else:
         raise ValueError("The weight point of interval could not be found."
                          "Options for order are: 'mid', 'low'.")
-        
-    randomlist = density_function(interval, default, randomness)
-    randomnumber = random.choice(randomlist)
+
+    if not 0. <= randomness <= 1.:
+        raise ValueError("Degree of randomness must be between 0 and 1.")
+
+    # draw from the density function without building it
+    if randomness > 0. and random.random() < randomness:
+        randomnumber = random.choice(interval)
+    else:
+        randomnumber = default
 
     return randomnumber    
 
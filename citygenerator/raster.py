@@ -0,0 +1,37 @@
+import numpy as np
+from .blocks import BlockArray
+
+
+# Blocks are painted onto regular grids of cells, the LES grid of voxels and the pixels
+# of plot.rasterize. A cell belongs to a block if its centre lies inside the block
+# footprint. Footprints are added to difference arrays, which requires blocks that do
+# not overlap, see checks.
+
+
+def cell_ranges(lower, upper, delta, n, origin=0.):
+    """Returns the first and last + 1 cell of the intervals [lower, upper)
+    on a grid of n cells with spacing delta that starts at origin."""
+    first = np.clip(np.ceil((np.asarray(lower) - origin) / delta - 0.5), 0, n).astype(np.int64)
+    last = np.clip(np.ceil((np.asarray(upper) - origin) / delta - 0.5), 0, n).astype(np.int64)
+    return first, np.maximum(first, last)
+
+
+def paint(blocks, values, imax, jtot, dx, dy, origin=(0., 0.)):
+    """Adds a value per block to all cells of its footprint.
+    Each footprint adds its value to four corners of a difference array,
+    and two cumulative sums spread the values over the footprints.
+    :param origin: lower left corner (x, y) of the grid.
+    :return: array of shape (imax, jtot)."""
+    blocks = BlockArray(blocks, ncols=6)
+    i0, i1 = cell_ranges(blocks.xmin, blocks.xmax, dx, imax, origin[0])
+    j0, j1 = cell_ranges(blocks.ymin, blocks.ymax, dy, jtot, origin[1])
+    values = np.broadcast_to(values, (len(blocks),))
+
+    diff = np.zeros((imax + 1, jtot + 1), dtype=values.dtype)
+    np.add.at(diff, (i0, j0), values)
+    np.add.at(diff, (i1, j0), -values)
+    np.add.at(diff, (i0, j1), -values)
+    np.add.at(diff, (i1, j1), values)
+    field = diff.cumsum(axis=0).cumsum(axis=1)[:imax, :jtot]
+
+    return field
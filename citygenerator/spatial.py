@@ -0,0 +1,189 @@
+import numpy as np
+from .blocks import BlockArray
+
+
+def _ragged(counts):
+    # owner of each entry of a ragged expansion and the position within its owner
+    owner = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, position
+
+
+def boundary_distance(points, blocks):
+    """Returns the distances of points to the faces of blocks, element-wise.
+    For points outside the footprint, the distance to the footprint; for points
+    inside, the distance to the nearest face."""
+    x, y = points[:, 0], points[:, 1]
+    dx = np.maximum(blocks[:, 0] - x, x - blocks[:, 1])
+    dy = np.maximum(blocks[:, 2] - y, y - blocks[:, 3])
+    outside = np.hypot(np.maximum(dx, 0), np.maximum(dy, 0))
+    inside = -np.maximum(dx, dy)
+    return np.where((dx <= 0) & (dy <= 0), inside, outside)
+
+
+class BlockIndex:
+    """Uniform grid index over the block footprints of a layout.
+    Every block is stored in all grid cells its footprint covers, as one array of
+    block indices sorted by cell with the start of each cell in cellstart. Queries
+    look up the candidates of the cells of many points or windows at once and test
+    them with array operations, in chunks of chunksize points.
+    :param blocks: layout.
+    :param cellsize: size of the grid cells, default is the median block length."""
+
+    def __init__(self, blocks, cellsize=None):
+        self.blocks = BlockArray(blocks)
+        b = self.blocks
+        n = len(b)
+        if cellsize is None:
+            cellsize = np.median(np.maximum(b.lengths, b.widths)) if n > 0 else 1.
+        self.cellsize = max(float(cellsize), 1e-12)
+        self.origin = np.array([np.amin(b.xmin), np.amin(b.ymin)]) if n > 0 else np.zeros(2)
+
+        i0, j0 = self._cell(b.xmin, b.ymin)
+        i1, j1 = self._cell(b.xmax, b.ymax)
+        self.shape = (int(np.amax(i1, initial=0)) + 1, int(np.amax(j1, initial=0)) + 1)
+
+        # all cells covered by each block
+        ni = i1 - i0 + 1
+        nj = j1 - j0 + 1
+        block, k = _ragged(ni * nj)
+        cells = (i0[block] + k // nj[block]) * self.shape[1] + j0[block] + k % nj[block]
+        order = np.argsort(cells, kind='stable')
+        self.cellblocks = block[order]
+        self.cellstart = np.searchsorted(cells[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def _cell(self, x, y):
+        i = np.floor((np.asarray(x) - self.origin[0]) / self.cellsize).astype(np.int64)
+        j = np.floor((np.asarray(y) - self.origin[1]) / self.cellsize).astype(np.int64)
+        return i, j
+
+    def _cellid(self, i, j):
+        # cell number, -1 outside the grid
+        inside = (i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1])
+        return np.where(inside, i * self.shape[1] + j, -1)
+
+    def _candidates(self, cells):
+        # owner in cells and block of all blocks stored in the given cells
+        valid = cells >= 0
+        start = self.cellstart[np.where(valid, cells, 0)]
+        counts = np.where(valid, self.cellstart[np.where(valid, cells, 0) + 1] - start, 0)
+        owner, position = _ragged(counts)
+        return owner, self.cellblocks[start[owner] + position]
+
+    # QUERIES
+    # -----------
+
+    def contains(self, points, chunksize=2**16):
+        """Returns the index of the block that contains each point, -1 for points
+        in streets. Blocks contain the points xmin <= x < xmax and ymin <= y < ymax.
+        :param points: array of shape (P, 2)."""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        result = np.full(len(points), -1, dtype=np.int64)
+        data = self.blocks.data
+        for start in range(0, len(points), chunksize):
+            p = points[start:start + chunksize]
+            owner, block = self._candidates(self._cellid(*self._cell(p[:, 0], p[:, 1])))
+            x, y = p[owner, 0], p[owner, 1]
+            b = data[block]
+            hit = (b[:, 0] <= x) & (x < b[:, 1]) & (b[:, 2] <= y) & (y < b[:, 3])
+            result[start + owner[hit]] = block[hit]
+        return result
+
+    def windows(self, windows):
+        """Returns the blocks that intersect each window [xmin, xmax, ymin, ymax].
+        :param windows: array of shape (W, 4).
+        :return: offsets and block indices, the blocks of window w are
+            indices[offsets[w]:offsets[w + 1]] in ascending order."""
+        windows = np.asarray(windows, dtype=float).reshape(-1, 4)
+        i0, j0 = self._cell(windows[:, 0], windows[:, 2])
+        i1, j1 = self._cell(windows[:, 1], windows[:, 3])
+        i0, j0 = np.maximum(i0, 0), np.maximum(j0, 0)
+        i1, j1 = np.minimum(i1, self.shape[0] - 1), np.minimum(j1, self.shape[1] - 1)
+        ni = np.maximum(i1 - i0 + 1, 0)
+        nj = np.maximum(j1 - j0 + 1, 0)
+
+        # cells covered by each window and their blocks
+        window, k = _ragged(ni * nj)
+        cells = (i0[window] + k // nj[window]) * self.shape[1] + j0[window] + k % nj[window]
+        owner, block = self._candidates(cells)
+        window = window[owner]
+
+        w = windows[window]
+        b = self.blocks.data[block]
+        hit = (b[:, 0] < w[:, 1]) & (w[:, 0] < b[:, 1]) & (b[:, 2] < w[:, 3]) & (w[:, 2] < b[:, 3])
+        pairs = np.unique(window[hit] * max(len(self), 1) + block[hit])
+        window, indices = np.divmod(pairs, max(len(self), 1))
+        offsets = np.searchsorted(window, np.arange(len(windows) + 1))
+
+        return offsets, indices
+
+    def window(self, window):
+        """Returns the indices of the blocks that intersect a window [xmin, xmax, ymin, ymax]."""
+        return self.windows([window])[1]
+
+    def nearest(self, points, chunksize=2**16):
+        """Returns the distance of each point to the nearest block face, and that block.
+        Cells are searched in square rings around the cell of each point, until the
+        nearest block found is closer than the edge of the searched square.
+        :param points: array of shape (P, 2).
+        :return: distances and block indices, inf and -1 for an empty layout."""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        distance = np.full(len(points), np.inf)
+        nearest = np.full(len(points), -1, dtype=np.int64)
+        if len(self) == 0:
+            return distance, nearest
+
+        for start in range(0, len(points), chunksize):
+            chunk = slice(start, start + chunksize)
+            d, b = self._nearest(points[chunk])
+            distance[chunk] = d
+            nearest[chunk] = b
+        return distance, nearest
+
+    def _nearest(self, points):
+        i, j = self._cell(points[:, 0], points[:, 1])
+        # ring after which all cells of the grid are searched
+        rmax = np.maximum.reduce([np.abs(i), np.abs(self.shape[0] - 1 - i),
+                                  np.abs(j), np.abs(self.shape[1] - 1 - j)])
+        distance = np.full(len(points), np.inf)
+        nearest = np.full(len(points), -1, dtype=np.int64)
+        active = np.arange(len(points))
+
+        r = 0
+        while len(active) > 0:
+            # offsets of the cells in ring r
+            di, dj = np.meshgrid(np.arange(-r, r + 1), np.arange(-r, r + 1), indexing='ij')
+            ring = np.maximum(np.abs(di), np.abs(dj)) == r
+            di, dj = di[ring], dj[ring]
+
+            point = np.repeat(active, len(di))
+            cells = self._cellid(i[point] + np.tile(di, len(active)), j[point] + np.tile(dj, len(active)))
+            owner, block = self._candidates(cells)
+            point = point[owner]
+            d = boundary_distance(points[point], self.blocks.data[block])
+
+            # nearest candidate of each point in this ring, candidates are grouped by point
+            if len(point) > 0:
+                starts = np.flatnonzero(np.r_[True, point[1:] != point[:-1]])
+                dmin = np.minimum.reduceat(d, starts)
+                counts = np.diff(np.r_[starts, len(point)])
+                ismin = np.flatnonzero(d == np.repeat(dmin, counts))
+                best = ismin[np.r_[True, point[ismin[1:]] != point[ismin[:-1]]]]
+            else:
+                best = np.zeros(0, dtype=np.int64)
+            closer = d[best] < distance[point[best]]
+            distance[point[best[closer]]] = d[best[closer]]
+            nearest[point[best[closer]]] = block[best[closer]]
+
+            # blocks outside ring r are at least as far as the edge of the searched square
+            x = (points[active] - self.origin) / self.cellsize
+            edge = np.minimum.reduce([x[:, 0] - (i[active] - r), i[active] + r + 1 - x[:, 0],
+                                      x[:, 1] - (j[active] - r), j[active] + r + 1 - x[:, 1]])
+            done = (distance[active] <= edge * self.cellsize) | (r >= rmax[active])
+            active = active[~done]
+            r += 1
+
+        return distance, nearest
@@ -0,0 +1,224 @@
+import numpy as np
+from . import fractal
+from .blocks import BlockArray
+
+
+class SplitTree:
+    """Quadtree of the splits of a layout subdivision.
+    Every block that is created while a layout is subdivided is a node, the first
+    block of the layout is the root in node 0. A split node has four children in
+    consecutive nodes, in the order of fractal.generate_layout: lower left, lower right,
+    upper right, upper left. The leaves are the blocks of the layout, with the heights
+    of the buildings and a green flag for green space.
+
+    Each node stores the built plan area, frontal area and green plan area of the
+    leaves below it, so the totals of the layout are the totals of the root. A subtree
+    can be generated again with a new seed or other parameters, see regenerate, which
+    only generates the blocks of the subtree and updates the totals along its path.
+    Regenerated trees are new trees; the nodes of the replaced subtree are kept but
+    are no longer alive, such that all trees can share the same base layout.
+    :param params: generation parameters that are reused by regenerate,
+        set by generate_layout."""
+
+    def __init__(self, params=None):
+        self.params = dict(params or {})
+        self.nnodes = 0
+        self._blocks = np.zeros((0, 6))
+        self._parent = np.zeros(0, dtype=np.int64)
+        self._first = np.zeros(0, dtype=np.int64)  # first child, -1 for leaves
+        self._level = np.zeros(0, dtype=np.int16)
+        self._alive = np.zeros(0, dtype=bool)
+        self._green = np.zeros(0, dtype=bool)
+        self._totals = np.zeros((0, 3))  # built plan, frontal and green plan area
+        self.slotnodes = []  # node of each slot of the Subdivision engine
+
+    def __len__(self):
+        return self.nnodes
+
+    def _append(self, blocks, parent):
+        blocks = BlockArray(blocks, ncols=6)
+        n = len(blocks)
+        if self.nnodes + n > len(self._blocks):
+            size = max(2 * len(self._blocks), self.nnodes + n, 64)
+            for name in ['_blocks', '_parent', '_first', '_level', '_alive', '_green', '_totals']:
+                old = getattr(self, name)
+                new = np.zeros((size,) + old.shape[1:], dtype=old.dtype)
+                new[:self.nnodes] = old[:self.nnodes]
+                setattr(self, name, new)
+        nodes = np.arange(self.nnodes, self.nnodes + n)
+        self._blocks[nodes] = blocks.data
+        self._parent[nodes] = parent
+        self._first[nodes] = -1
+        self._level[nodes] = self._level[parent] + 1 if parent >= 0 else 0
+        self._alive[nodes] = True
+        self._green[nodes] = False
+        self._totals[nodes] = 0.
+        self.nnodes += n
+        return nodes
+
+    def copy(self):
+        """Returns a copy of the tree."""
+        tree = SplitTree(self.params)
+        tree._append(self._blocks[:self.nnodes], -1)
+        for name in ['_parent', '_first', '_level', '_alive', '_green', '_totals']:
+            getattr(tree, name)[:self.nnodes] = getattr(self, name)[:self.nnodes]
+        return tree
+
+    # RECORDING
+    # -----------
+
+    def start(self, block, **params):
+        """Records the first block of a subdivision as root and the generation
+        parameters, see generate_layout."""
+        self.params.update(params)
+        self.slotnodes = self._append([block], -1).tolist()
+
+    def split(self, slot, newblocks):
+        """Records the split of the block in a slot of the Subdivision engine
+        into four new blocks, which are added to the next slots."""
+        node = self.slotnodes[slot]
+        nodes = self._append(newblocks, node)
+        self._first[node] = nodes[0]
+        self.slotnodes.extend(nodes.tolist())
+
+    def finish(self, slots, green, blocks3d, greenspace):
+        """Records the final blocks and computes the totals of all recorded nodes.
+        :param slots: slots of the layout blocks.
+        :param green: mask of the green blocks in slots.
+        :param blocks3d, greenspace: 3D built and green blocks in the order of slots."""
+        nodes = np.asarray(self.slotnodes, dtype=np.int64)
+        leaves = nodes[slots]
+        self._blocks[leaves[~green]] = BlockArray(blocks3d, ncols=6).data
+        self._blocks[leaves[green]] = BlockArray(greenspace, ncols=6).data
+        self._green[leaves] = green
+        self._sum(nodes)
+
+    def _sum(self, nodes):
+        # totals of a subtree, leaves first and then the split nodes level by level
+        blocks = BlockArray(self._blocks[nodes], ncols=6)
+        leaf = self._first[nodes] < 0
+        built = leaf & ~self._green[nodes]
+        self._totals[nodes] = np.stack([blocks.plans * built, blocks.fronts * built,
+                                        blocks.plans * (leaf & self._green[nodes])], axis=1)
+        levels = self._level[nodes]
+        for level in range(np.amax(levels), np.amin(levels), -1):
+            children = nodes[levels == level]
+            np.add.at(self._totals, self._parent[children], self._totals[children])
+
+    # TREE STRUCTURE
+    # -----------
+
+    def children(self, node):
+        """Returns the children of a node, empty for leaves."""
+        first = self._first[node]
+        return np.arange(first, first + 4) if first >= 0 else np.zeros(0, dtype=np.int64)
+
+    def subtree(self, node):
+        """Returns the nodes of the subtree of a node, level by level."""
+        subtree = [np.array([node], dtype=np.int64)]
+        while True:
+            first = self._first[subtree[-1]]
+            first = first[first >= 0]
+            if len(first) == 0:
+                break
+            subtree.append((first[:, None] + np.arange(4)).ravel())
+        return np.concatenate(subtree)
+
+    def path(self, node):
+        """Returns the nodes from a node up to the root."""
+        path = [node]
+        while self._parent[path[-1]] >= 0:
+            path.append(int(self._parent[path[-1]]))
+        return np.array(path, dtype=np.int64)
+
+    def locate(self, x, y, level=None):
+        """Returns the node of a point, the leaf that contains it or its ancestor
+        on a given level, -1 if the point lies in a street."""
+        node = 0
+        block = self._blocks[node]
+        if not (block[0] <= x < block[1] and block[2] <= y < block[3]):
+            return -1
+        while self._first[node] >= 0 and (level is None or self._level[node] < level):
+            children = self.children(node)
+            blocks = self._blocks[children]
+            inside = (blocks[:, 0] <= x) & (x < blocks[:, 1]) & (blocks[:, 2] <= y) & (y < blocks[:, 3])
+            if not np.any(inside):
+                return -1
+            node = int(children[np.argmax(inside)])
+        return node
+
+    @property
+    def leaves(self):
+        """Nodes of the blocks of the layout."""
+        return np.flatnonzero(self._alive[:self.nnodes] & (self._first[:self.nnodes] < 0))
+
+    @property
+    def levels(self):
+        """Split level of all nodes."""
+        return self._level[:self.nnodes]
+
+    def blocks(self, nodes=None):
+        """Returns the blocks of nodes, all nodes by default, as BlockArray.
+        Split nodes have zero height."""
+        if nodes is None:
+            nodes = np.arange(self.nnodes)
+        return BlockArray(self._blocks[nodes], ncols=6)
+
+    def layout(self):
+        """Returns the built blocks and green space of the layout."""
+        leaves = self.leaves
+        green = self._green[leaves]
+        return self.blocks(leaves[~green]), self.blocks(leaves[green])
+
+    # TOTALS
+    # -----------
+
+    def planarea(self, node=0):
+        """Returns the built plan area below a node."""
+        return self._totals[node, 0]
+
+    def frontarea(self, node=0):
+        """Returns the frontal area below a node, for U wind."""
+        return self._totals[node, 1]
+
+    def greenarea(self, node=0):
+        """Returns the green plan area below a node."""
+        return self._totals[node, 2]
+
+    # REGENERATION
+    # -----------
+
+    def regenerate(self, node, seed=None, pbuild=None, pgreen=None, pfrontal=None, **params):
+        """Generates the subtree of a node again and returns the tree of the new layout.
+        The block of the node is subdivided like a domain in generate_layout, and
+        greenery and heights are only generated for the new blocks. The totals are
+        computed for the new subtree and updated along the path to the root.
+        The densities refer to the plan area of the block of the node and default to
+        the densities of the current subtree.
+        :param node: node to regenerate, e.g. from locate.
+        :param seed: None, an integer or a numpy random generator.
+        :param pbuild, pgreen, pfrontal: plan, green and frontal area densities.
+        :param params: generation parameters that replace those of the tree,
+            order, layoutrandom, heightrandom, minwidth, minvolume, maxheight and heightmethod."""
+        params = dict(self.params, **params)
+        area = BlockArray(self._blocks[[node]], ncols=6).plans[0]
+        pbuild = self.planarea(node) / area if pbuild is None else pbuild
+        pgreen = self.greenarea(node) / area if pgreen is None else pgreen
+        pfrontal = self.frontarea(node) / area if pfrontal is None else pfrontal
+
+        tree = self.copy()
+        tree.params = params
+        old = tree._totals[node].copy()
+        tree._alive[tree.subtree(node)[1:]] = False
+        tree._first[node] = -1
+        tree._blocks[node, 4:] = 0.
+        tree._green[node] = False
+        tree.slotnodes = [node]
+
+        fractal.generate_block(tree._blocks[node, :4], pbuild, pgreen, pfrontal, seed=seed, tree=tree, **params)
+
+        # totals of the new subtree, the ancestors change by the difference of the node
+        ancestors = tree.path(node)[1:]
+        tree._totals[ancestors] += tree._totals[node] - old
+
+        return tree
@@ -0,0 +1,191 @@
+import numpy as np
+
+
+# street types in the order of fractal.STREETWIDTHS
+STREETTYPES = ["boulevard", "highstreet", "residentialstreet", "mews"]
+
+# streets are segments along y (axis 0, at x = position) or along x (axis 1, at y = position)
+STREET = np.dtype([('axis', np.int8),
+                   ('position', np.float64),
+                   ('start', np.float64),
+                   ('end', np.float64),
+                   ('width', np.float64),
+                   ('type', np.int8),
+                   ('level', np.int16),
+                   ('ends', np.int32, 2),  # streets at start and end
+                   ('image', np.bool_)])  # periodic image of a main street
+
+
+class StreetNetwork:
+    """Street network recorded while a layout is subdivided.
+    Every split of a block draws one street along y at the x intersection and one
+    street along x at the y intersection, which end at the streets around the block.
+    Streets are stored in a structured array with their centre line, width, type and
+    generation level. The streets around each block are stored per slot of the
+    Subdivision engine, as [left, right, bottom, top].
+    The main streets of the first split are periodic; they are recorded on both sides
+    of the domain, the copies on the lower sides are marked as image."""
+
+    def __init__(self):
+        self._streets = np.zeros(0, dtype=STREET)
+        self.nstreets = 0
+        self.size = None  # domain lengths in x and y
+        self.crossings = []  # pairs of streets that cross at a split
+        self.slotstreets = []  # streets around each slot
+        self.slotlevels = []  # generation level of each slot
+        self.blockstreets = np.zeros((0, 4), dtype=np.int64)  # streets around the final blocks
+
+    def __len__(self):
+        return self.nstreets
+
+    @property
+    def streets(self):
+        """Structured array of all recorded streets."""
+        return self._streets[:self.nstreets]
+
+    def _record(self, axis, position, ends, width, streettype, level, image=False):
+        if self.nstreets == len(self._streets):
+            streets = np.zeros(max(2 * len(self._streets), 64), dtype=STREET)
+            streets[:self.nstreets] = self.streets
+            self._streets = streets
+        street = self._streets[self.nstreets]
+        street['axis'] = axis
+        street['position'] = position
+        street['start'] = self._streets[ends[0]]['position'] if ends[0] < self.nstreets else position
+        street['end'] = self._streets[ends[1]]['position'] if ends[1] < self.nstreets else position
+        street['width'] = width
+        street['type'] = STREETTYPES.index(streettype)
+        street['level'] = level
+        street['ends'] = ends
+        street['image'] = image
+        self.nstreets += 1
+        return self.nstreets - 1
+
+    def start(self, xposition, yposition, xsize, ysize, xwidth, ywidth, streettype):
+        """Records the periodic main streets at the upper right corner of the domain,
+        which enclose the first block in slot 0."""
+        self.size = (xsize, ysize)
+        # main streets 0 and 2 and their images 1 and 3 on the lower sides
+        for axis, position, size, width in [(0, xposition, xsize, xwidth), (1, yposition, ysize, ywidth)]:
+            ends = (3, 2) if axis == 0 else (1, 0)
+            self._record(axis, position, ends, width, streettype, 0)
+            self._record(axis, position - size, ends, width, streettype, 0, image=True)
+        # the positions of the end streets are only known now
+        self._streets[:4]['start'] = self._streets[self._streets[:4]['ends'][:, 0]]['position']
+        self._streets[:4]['end'] = self._streets[self._streets[:4]['ends'][:, 1]]['position']
+        self.slotstreets.append([1, 0, 3, 2])
+        self.slotlevels.append(0)
+
+    def split(self, slot, xposition, yposition, xwidth, ywidth, streettype):
+        """Records the two streets of the split of a slot and the streets around
+        its four new blocks, which are added to the next slots in the order of
+        fractal.generate_layout: lower left, lower right, upper right, upper left."""
+        left, right, bottom, top = self.slotstreets[slot]
+        level = self.slotlevels[slot] + 1
+        x = self._record(0, xposition, (bottom, top), xwidth, streettype, level)
+        y = self._record(1, yposition, (left, right), ywidth, streettype, level)
+        self.crossings.append((x, y))
+        self.slotstreets.extend([[left, x, bottom, y], [x, right, bottom, y],
+                                 [x, right, y, top], [left, x, y, top]])
+        self.slotlevels.extend([level] * 4)
+
+    def select(self, slots):
+        """Sets the blocks of the layout to the blocks in the given slots."""
+        self.blockstreets = np.array(self.slotstreets, dtype=np.int64).reshape(-1, 4)[slots]
+
+    # NETWORK PROPERTIES
+    # -----------
+
+    @property
+    def lengths(self):
+        """Lengths of the street centre lines."""
+        return self.streets['end'] - self.streets['start']
+
+    @property
+    def types(self):
+        """Street type names of all streets."""
+        return np.array(STREETTYPES)[self.streets['type']]
+
+    def graph(self):
+        """Returns the street network as graph of junctions and street segments.
+        Nodes are the ends of streets, where they meet the streets around the split
+        block, and the crossings of the streets of a split. Every street is cut into
+        edges at all nodes on its centre line.
+        :return: nodes of shape (K, 2) with x and y, edges of shape (E, 2) with node
+            indices, and the street of each edge."""
+        streets = self.streets
+        ids = np.arange(self.nstreets)
+        crossings = np.array(self.crossings, dtype=np.int64).reshape(-1, 2)
+
+        # points on the centre lines as (street, coordinate along the street):
+        # own ends, ends of other streets that meet it, and crossings
+        street = np.concatenate([ids, ids, streets['ends'][:, 0], streets['ends'][:, 1],
+                                 crossings[:, 0], crossings[:, 1]])
+        along = np.concatenate([streets['start'], streets['end'], streets['position'], streets['position'],
+                                streets['position'][crossings[:, 1]], streets['position'][crossings[:, 0]]])
+        position = streets['position'][street]
+        axis = streets['axis'][street]
+        points = np.where(axis[:, None] == 0, np.stack([position, along], axis=1),
+                          np.stack([along, position], axis=1))
+        nodes, node = np.unique(np.round(points, 9), axis=0, return_inverse=True)
+        node = node.ravel()
+
+        # consecutive distinct nodes along each street are edges
+        order = np.lexsort((along, street))
+        street, node = street[order], node[order]
+        edge = (street[1:] == street[:-1]) & (node[1:] != node[:-1])
+        edges = np.stack([node[:-1][edge], node[1:][edge]], axis=1)
+        edgestreets = street[:-1][edge]
+        edges, unique = np.unique(edges, axis=0, return_index=True)
+
+        return nodes, edges, edgestreets[unique]
+
+    def periodic(self):
+        """Returns for every street the street it belongs to across the periodic
+        boundary: for images the street with the same axis and position modulo the
+        domain length, for all other streets the street itself."""
+        streets = self.streets
+        ids = np.arange(self.nstreets)
+        if self.size is None:
+            return ids
+        position = np.mod(streets['position'], np.asarray(self.size)[streets['axis']])
+        for image in np.flatnonzero(streets['image']):
+            same = ((streets['axis'] == streets['axis'][image]) & ~streets['image'] &
+                    np.isclose(position, position[image]))
+            if np.any(same):
+                ids[image] = np.argmax(same)
+        return ids
+
+    def canyon_ratios(self, blocks):
+        """Returns the canyon aspect ratio of every street, the mean height of the
+        blocks along the street divided by the street width, nan for streets without
+        blocks along them. A periodic street and its image share the blocks on both
+        sides of the domain boundary, see periodic.
+        :param blocks: 3D blocks of the layout in the order of the selected slots."""
+        heights = blocks.heights
+        ids = self.periodic()
+        blockstreets = ids[self.blockstreets]
+        total = np.zeros(self.nstreets)
+        count = np.zeros(self.nstreets)
+        for side in range(4):
+            total += np.bincount(blockstreets[:, side], weights=heights, minlength=self.nstreets)
+            count += np.bincount(blockstreets[:, side], minlength=self.nstreets)
+        meanheight = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+        return meanheight[ids] / self.streets['width']
+
+    def summary(self):
+        """Returns street statistics per street type as columnar table with the
+        number of streets, total and mean length and mean width, without images."""
+        streets = self.streets[~self.streets['image']]
+        lengths = streets['end'] - streets['start']
+        n = len(STREETTYPES)
+        count = np.bincount(streets['type'], minlength=n)
+        table = {}
+        table['type'] = np.array(STREETTYPES)
+        table['count'] = count
+        table['length'] = np.bincount(streets['type'], weights=lengths, minlength=n)
+        table['meanlength'] = np.where(count > 0, table['length'] / np.maximum(count, 1), np.nan)
+        table['meanwidth'] = np.where(count > 0, np.bincount(streets['type'], weights=streets['width'],
+                                                             minlength=n) / np.maximum(count, 1), np.nan)
+        return table
@@ -0,0 +1,169 @@
+import numpy as np
+from collections import deque
+from . import randomiser
+from .blocks import BlockArray
+
+
+class Subdivision:
+    """Subdivision engine for block layouts.
+    Blocks are kept in append-only slots in the order of a list where new blocks
+    are appended at the end and split blocks are deleted. Split blocks are only
+    marked as removed, so a split does not copy the block list.
+    The total plan area of the blocks is updated by the area change of each split.
+
+    Blocks that can still be split are indexed by their size class, the number of
+    possible street widths they can fit in x and y. For drawn street widths, the
+    blocks that are large enough are found in the size classes above the widths,
+    such that a block is selected in O(1) and only fails if no block is large enough.
+    :param block: initial block [xmin, xmax, ymin, ymax].
+    :param xwidths: all street widths in x that can be drawn.
+    :param ywidths: all street widths in y that can be drawn.
+    :param minwidth: minimum distance of streets to the block edges.
+    :param history: optional History that records added and removed blocks,
+        its slots are the slots of the engine."""
+
+    def __init__(self, block, xwidths, ywidths, minwidth=10, history=None):
+        self.xwidths = np.unique(xwidths)
+        self.ywidths = np.unique(ywidths)
+        self.minwidth = minwidth
+        self.slots = BlockArray(ncols=4)  # all blocks ever created
+        self.used = []
+        self.nblocks = 0
+        self.area = 0.
+
+        # number of blocks and first block per size class
+        self.counts = np.zeros((len(self.xwidths) + 1, len(self.ywidths) + 1), dtype=np.int64)
+        self.heads = np.full(self.counts.shape, np.inf)
+        # blocks per size class, as list for random picks and ordered queue for first picks
+        self.members = {}
+        self.queues = {}
+        self.sizeclass = []
+        self.position = []
+        self.history = history
+
+        self._add([block])
+
+    def __len__(self):
+        return self.nblocks
+
+    def __getitem__(self, slot):
+        """Returns the block in a given slot."""
+        return self.slots[slot]
+
+    def _classify(self, blocks):
+        # number of possible street widths that fit into the blocks
+        xclass = np.searchsorted(self.xwidths, blocks.lengths - self.minwidth, side='left')
+        yclass = np.searchsorted(self.ywidths, blocks.widths - self.minwidth, side='left')
+        return xclass.tolist(), yclass.tolist()
+
+    def _add(self, newblocks):
+        newblocks = BlockArray(newblocks)
+        first = len(self.slots)
+        self.slots.extend(newblocks)
+        self.area += np.sum(newblocks.plans)
+        for slot, key in enumerate(zip(*self._classify(newblocks)), start=first):
+            self.used.append(True)
+            self.sizeclass.append(key)
+            if key not in self.members:
+                self.members[key] = []
+                self.queues[key] = deque()
+            self.position.append(len(self.members[key]))
+            self.members[key].append(slot)
+            self.queues[key].append(slot)
+            if self.counts[key] == 0:
+                self.heads[key] = slot
+            self.counts[key] += 1
+        self.nblocks += len(newblocks)
+        if self.history is not None:
+            self.history.add(newblocks)
+
+    def _remove(self, slot):
+        block = self.slots[slot]
+        self.area -= (block[1] - block[0]) * (block[3] - block[2])
+        self.used[slot] = False
+        key = self.sizeclass[slot]
+        # swap with last member of its class and remove it in O(1)
+        members = self.members[key]
+        last = members.pop()
+        if last != slot:
+            members[self.position[slot]] = last
+            self.position[last] = self.position[slot]
+        # slots are added in increasing order, the queue keeps the first in front
+        queue = self.queues[key]
+        while queue and not self.used[queue[0]]:
+            queue.popleft()
+        self.heads[key] = queue[0] if queue else np.inf
+        self.counts[key] -= 1
+        self.nblocks -= 1
+        if self.history is not None:
+            self.history.remove(slot)
+
+    def split(self, slot, newblocks):
+        """Replaces the block in a given slot by a set of new blocks.
+        The new blocks are added to the end and the split block is removed."""
+        self._remove(slot)
+        self._add(newblocks)
+
+    def fits(self, slot, xwidth, ywidth):
+        """Returns whether streets of the given widths fit into a block."""
+        block = self.slots[slot]
+        return (xwidth < block[1] - block[0] - self.minwidth) and \
+            (ywidth < block[3] - block[2] - self.minwidth)
+
+    def select(self, order, xwidth, ywidth, rng=None):
+        """Selects a block that is large enough for streets of the given widths.
+        :param order: 'random' picks a random block, 'hierarchical' the first block
+            in list order and 'cascade' the largest of the four newest blocks.
+        :param xwidth, ywidth: street widths, values of xwidths and ywidths.
+        :param rng: numpy random generator for random order.
+        :return: slot of the block, None if no block is large enough."""
+
+        # blocks in size classes above the widths are large enough
+        xclass = np.searchsorted(self.xwidths, xwidth, side='left')
+        yclass = np.searchsorted(self.ywidths, ywidth, side='left')
+        eligible = self.counts[xclass + 1:, yclass + 1:]
+
+        slot = None
+        if order in ["random", "r"]:
+            total = np.sum(eligible)
+            if total > 0:
+                # pick a random eligible block, going through the classes
+                k = randomiser.get_rng(rng).integers(total)
+                cumulative = np.cumsum(eligible)
+                c = np.searchsorted(cumulative, k, side='right')
+                i, j = np.unravel_index(c, eligible.shape)
+                k -= cumulative[c] - eligible[i, j]
+                slot = self.members[(int(i + xclass + 1), int(j + yclass + 1))][k]
+
+        elif order in ["hierarchical", "h"]:
+            first = np.min(self.heads[xclass + 1:, yclass + 1:], initial=np.inf)
+            if first < np.inf:
+                slot = int(first)
+
+        elif order in ["cascade", "c"]:
+            # find block with largest area amongst newest blocks
+            newest = []
+            s = len(self.slots)
+            while len(newest) < min(4, self.nblocks):
+                s -= 1
+                if self.used[s]:
+                    newest.insert(0, s)
+            plans = [(self.slots[s][1] - self.slots[s][0]) * (self.slots[s][3] - self.slots[s][2])
+                     for s in newest]
+            slot = newest[int(np.argmax(plans))]
+            # if block is too small, return none
+            if not self.fits(slot, xwidth, ywidth):
+                slot = None
+
+        else:
+            raise ValueError("The input order could not be found."
+                             "Options for order are: 'random', 'hierarchical' and 'cascade'.")
+
+        if slot is None:
+            print("Warning: blocks are too small, further block division stopped.")
+
+        return slot
+
+    def blocks(self):
+        """Returns the blocks that have not been split as BlockArray."""
+        return self.slots[np.array(self.used, dtype=bool)]
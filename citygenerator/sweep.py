@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from . import fractal
+from . import utils
+from .blocks import BlockArray
+
+
+# scalar block statistics that are stored for every layout
+STATS = ['nblocks', 'heightmax', 'heightmean', 'heightstd', 'planindex', 'frontindex']
+
+
+# RESULT STORE
+# -----------
+
+class ResultStore:
+    """Append-only on-disk store of generated layouts and their statistics.
+    Blocks and greenspace of all layouts are appended to the binary file blocks.bin
+    as rows of 6 float64 values. After the blocks of a layout are written, one JSON
+    line with its key, parameters, statistics and row offset is appended to
+    index.jsonl. A layout only counts as stored when its index line is complete,
+    blocks of an interrupted write are cut off when the store is opened again.
+    :param path: directory of the store, created if it does not exist."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.blockfile = os.path.join(path, "blocks.bin")
+        self.indexfile = os.path.join(path, "index.jsonl")
+        self.keys = set()
+        self.nrows = 0
+
+        # read complete index lines, drop a partial last line
+        valid = 0
+        if os.path.exists(self.indexfile):
+            with open(self.indexfile, 'rb') as file:
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    record = json.loads(line)
+                    self.keys.add(record['key'])
+                    self.nrows = max(self.nrows, record['offset'] + record['nblocks'] + record['ngreen'])
+                    valid += len(line)
+            with open(self.indexfile, 'r+b') as file:
+                file.truncate(valid)
+
+        # cut off blocks that were written without index line
+        with open(self.blockfile, 'ab') as file:
+            file.truncate(self.nrows * 6 * 8)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def append(self, key, record, blocks, greenspace):
+        """Appends a layout to the store.
+        :param key: unique key of the layout.
+        :param record: dictionary of parameters and statistics, must be JSON serialisable.
+        :param blocks, greenspace: blocks and greenspace of the layout."""
+
+        blocks = BlockArray(blocks, ncols=6)
+        greenspace = BlockArray(greenspace, ncols=6)
+        record = dict(record, key=key, offset=self.nrows,
+                      nblocks=len(blocks), ngreen=len(greenspace))
+
+        with open(self.blockfile, 'ab') as file:
+            file.write(blocks.data.astype('<f8').tobytes())
+            file.write(greenspace.data.astype('<f8').tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        with open(self.indexfile, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.keys.add(key)
+        self.nrows += len(blocks) + len(greenspace)
+
+    def records(self):
+        """Iterates over the index records of all stored layouts."""
+        with open(self.indexfile, 'r') as file:
+            for line in file:
+                yield json.loads(line)
+
+    def load(self, record):
+        """Returns blocks and greenspace of a stored layout from its index record."""
+        data = np.memmap(self.blockfile, dtype='<f8', mode='r').reshape(-1, 6)
+        start = record['offset']
+        middle = start + record['nblocks']
+        end = middle + record['ngreen']
+        return BlockArray(data[start:middle], ncols=6), BlockArray(data[middle:end], ncols=6)
+
+
+# SUPPORT FUNCTIONS FOR SWEEPS
+# -----------
+
+def parameter_grid(grid):
+    """Returns all combinations of a grid of parameters.
+    :param grid: dictionary of parameter names and lists of values.
+    :return: list of parameter dictionaries."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def cell_key(cell):
+    """Returns a unique string key of a grid cell."""
+    return json.dumps(cell, sort_keys=True)
+
+
+def sweep_key(params, seed):
+    """Returns a short stable key of the fixed parameters and the master seed of a
+    sweep, such that realisations of sweeps with other settings have other keys."""
+    settings = json.dumps({'params': params, 'seed': seed}, sort_keys=True, default=str)
+    return hashlib.sha256(settings.encode()).hexdigest()[:16]
+
+
+def realisation_seed(seed, cell, i):
+    """Returns the seed of realisation i of a grid cell. The seed only depends on the
+    master seed and the cell parameters, not on the grid or the order of the sweep."""
+    cellid = int(hashlib.sha256(cell_key(cell).encode()).hexdigest()[:16], 16)
+    return np.random.SeedSequence(seed, spawn_key=(cellid, i))
+
+
+def generate_realisation(params, seed):
+    """Generates one layout and returns its blocks, greenspace and statistics."""
+    blocks, greenspace, _ = fractal.generate_layout(**params, seed=seed)
+    blockstats = utils.calculate_blockstats(blocks, a0=params['xsize'] * params['ysize'])
+    stats = {key: float(blockstats[key]) for key in STATS}
+    return blocks.data, greenspace.data, stats
+
+
+# -----------
+# MAIN SWEEP FUNCTION
+
+def run_sweep(grid, params, nseeds, path, workers=None, seed=0):
+    """Runs a parameter sweep and streams every layout to a ResultStore.
+    Realisations that are already in the store are skipped, so that an interrupted
+    sweep continues where it stopped. The keys of the realisations contain the
+    sweep_key of params and seed, so a sweep with other fixed parameters or another
+    seed in the same store does not skip them, and its records can be told apart
+    by their 'sweep' entry. At most two realisations per worker are
+    in flight, finished layouts are written as they complete.
+    :param grid: dictionary of swept generate_layout parameters and lists of values.
+    :param params: dictionary of the fixed generate_layout parameters.
+    :param nseeds: number of realisations per grid cell.
+    :param path: directory of the result store.
+    Optional:
+    :param workers: number of worker processes, default is the number of cores.
+        workers=1 runs the sweep in the current process.
+    :param seed: master seed of the sweep.
+    :return: the ResultStore."""
+
+    store = ResultStore(path)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    sweep = sweep_key(params, seed)
+
+    def tasks():
+        for cell in parameter_grid(grid):
+            for i in range(nseeds):
+                key = cell_key(cell) + "#" + str(i) + "@" + sweep
+                if key not in store:
+                    yield key, cell, i, dict(params, **cell), realisation_seed(seed, cell, i)
+
+    def save(key, cell, i, result):
+        blocks, greenspace, stats = result
+        store.append(key, dict(cell, realisation=i, sweep=sweep, **stats), blocks, greenspace)
+
+    if workers == 1:
+        for key, cell, i, taskparams, taskseed in tasks():
+            save(key, cell, i, generate_realisation(taskparams, taskseed))
+        return store
+
+    pending = {}
+    queue = tasks()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for task in itertools.islice(queue, 2 * workers):
+            pending[pool.submit(generate_realisation, *task[3:])] = task[:3]
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, cell, i = pending.pop(future)
+                save(key, cell, i, future.result())
+                for task in itertools.islice(queue, 1):
+                    pending[pool.submit(generate_realisation, *task[3:])] = task[:3]
+
+    return store
@@ -0,0 +1,136 @@
+import os
+import math
+import numpy as np
+from . import fractal
+from . import randomiser
+from .blocks import BlockArray
+from .ensemble import spawn_seeds, split_blocks, _share, _run_shared
+
+
+# Large domains are generated in tiles: a coarse grid of streets divides the domain
+# into super-blocks, which are subdivided independently with fractal.generate_block,
+# each from its own seed spawned from the master seed. The tiles only share the coarse
+# streets, so they can be generated in separate processes and stitched by stacking
+# their blocks.
+
+
+# SUPPORT FUNCTIONS FOR TILES
+# -----------
+
+def coarse_grid(size, ntiles, delta=1, margin=4, sampler=None):
+    """Returns a coarse street grid along one axis, ntiles evenly spaced boulevards
+    whose upper edges are at the tile boundaries. The last street lies at the upper
+    end of the domain, as the main street of generate_layout.
+    :return: array of shape (ntiles, 2) with street centres and widths."""
+    if sampler is None:
+        sampler = randomiser.Sampler()
+    edges = margin + np.round(np.arange(1, ntiles + 1) * size / ntiles / delta) * delta
+    widths = np.array([fractal.get_streetwidth(n=1, layout="l", delta=delta, sampler=sampler)
+                       for _ in range(ntiles)])
+    return np.stack([edges - widths/2, widths], axis=1)
+
+
+def tile_blocks(xstreets, ystreets, xsize, ysize):
+    """Returns the super-blocks between the streets of a coarse grid.
+    Streets are periodic, the first tile in each direction starts at the last street
+    shifted by the domain size. Tiles are ordered along x first.
+    :param xstreets, ystreets: street centres and widths of the streets along y
+        and along x, arrays of shape (n, 2) in ascending order.
+    :return: BlockArray of tiles [xmin, xmax, ymin, ymax]."""
+    xstreets = np.asarray(xstreets, dtype=float).reshape(-1, 2)
+    ystreets = np.asarray(ystreets, dtype=float).reshape(-1, 2)
+    xlower = np.roll(xstreets[:, 0] + xstreets[:, 1]/2, 1)
+    xlower[0] -= xsize
+    ylower = np.roll(ystreets[:, 0] + ystreets[:, 1]/2, 1)
+    ylower[0] -= ysize
+    xupper = xstreets[:, 0] - xstreets[:, 1]/2
+    yupper = ystreets[:, 0] - ystreets[:, 1]/2
+
+    i = np.tile(np.arange(len(xstreets)), len(ystreets))
+    j = np.repeat(np.arange(len(ystreets)), len(xstreets))
+    return BlockArray(np.stack([xlower[i], xupper[i], ylower[j], yupper[j]], axis=1))
+
+
+def generate_tiles(tiles, densities, params, seeds):
+    """Generates the layouts of tiles and returns blocks and greenspace of all
+    tiles as one array, with the number of blocks and green blocks per tile.
+    :param densities: plan, green and frontal area densities of the tiles."""
+    layouts = []
+    counts = np.zeros((len(seeds), 2), dtype=np.int64)
+    for i, (tile, seed) in enumerate(zip(tiles, seeds)):
+        blocks, greenspace = fractal.generate_block(tile, *densities, seed=seed, **params)
+        layouts.extend([blocks.data, greenspace.data])
+        counts[i] = [len(blocks), len(greenspace)]
+    data = np.concatenate(layouts) if layouts else np.zeros((0, 6))
+    return data, counts
+
+
+def _generate_shared(tiles, densities, params, seeds):
+    # worker: generate tiles and hand the block array back in shared memory
+    data, counts = generate_tiles(tiles, densities, params, seeds)
+    return _share(data), counts
+
+
+# -----------
+# MAIN TILED FUNCTION
+
+def generate_tiled(xsize, ysize, zsize, imax, jtot, kmax,
+                   pbuild, pgreen, pfrontal, order="random",
+                   layoutrandom=0., heightrandom=0.,
+                   margin=4, minwidth=5, minvolume=10,
+                   tilesize=500, grid=None, workers=None, seed=None, chunksize=None, heightmethod="grow"):
+    """Generates a layout of a large domain in tiles, in parallel.
+    The domain is divided into super-blocks by a coarse grid of boulevards, about
+    tilesize apart, or by a given grid. The plan, green and frontal area targets of
+    the domain are divided over the tiles by their plan area, and every tile is
+    subdivided like a domain in generate_layout. Tile i is generated from the i-th
+    seed spawned from the master seed, so the layout does not depend on the number of workers.
+    The parameters are those of generate_layout, and:
+    :param tilesize: distance of the coarse streets.
+    :param grid: coarse street grid as (xstreets, ystreets), street centres and widths
+        of the streets along y and along x in arrays of shape (n, 2), see tile_blocks.
+    :param workers: number of worker processes. Default is the number of cores,
+        workers=1 generates all tiles in the current process.
+    :param seed: master seed, integer or numpy SeedSequence.
+        If None, it is drawn from Python's random module.
+    :param chunksize: number of tiles per task. Default divides the tiles into
+        four tasks per worker.
+    :return: blocks, greenspace and the tiles."""
+
+    a0 = xsize * ysize  # domain size
+    # resolution
+    dx = xsize/imax
+    dy = ysize/jtot
+    dz = zsize/kmax
+
+    # one child seed draws the coarse grid, the other spawns the seeds of the tiles
+    gridseed, tileseed = spawn_seeds(2, seed)
+    if grid is None:
+        sampler = randomiser.Sampler(layoutrandom, gridseed)
+        grid = (coarse_grid(xsize, max(1, round(xsize/tilesize)), dx, margin, sampler),
+                coarse_grid(ysize, max(1, round(ysize/tilesize)), dy, margin, sampler))
+    tiles = tile_blocks(*grid, xsize, ysize)
+    n = len(tiles)
+    seeds = spawn_seeds(n, tileseed)
+
+    # targets of the domain, relative to the plan area of the tiles
+    scale = a0 / np.sum(tiles.plans)
+    densities = (pbuild * scale, pgreen * scale, pfrontal * scale)
+    params = dict(dx=dx, dy=dy, dz=dz, order=order, layoutrandom=layoutrandom,
+                  heightrandom=heightrandom, minwidth=minwidth, minvolume=minvolume,
+                  maxheight=round(zsize/6), heightmethod=heightmethod)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, math.ceil(n / (4 * workers)))
+
+    if workers == 1 or n <= 1:
+        data, counts = generate_tiles(tiles.data, densities, params, seeds)
+    else:
+        tasks = [(tiles.data[i:i + chunksize], densities, params, seeds[i:i + chunksize])
+                 for i in range(0, n, chunksize)]
+        data, counts = _run_shared(_generate_shared, tasks, workers)
+
+    blocks, greenspace = split_blocks(data, counts)
+    return BlockArray(blocks.data), BlockArray(greenspace.data), tiles
@@ -1,4 +1,6 @@
 import numpy as np
+from .blocks import BlockArray, BlockBatch, asblockarray
+from . import blockfiles
 
 
 def area(x, y):
@@ -10,24 +12,14 @@ def area(x, y):
 def blockplan(blocks):
     """Returns sum of all block plan areas.
     Block entries stored as block = [xmin, xmax, ymin, ymax]"""
-    areas = 0
-    for block in blocks:
-        x = block[0:2]
-        y = block[2:4]
-        areas += area(x, y)
-    return areas
+    return np.sum(asblockarray(blocks).plans)
 
 
 def blockfront(blocks):
     """Returns sum of all block frontal areas facing the wind.
     Wind is U wind only, the front is the y-z surface of blocks.
     Block entries stored as block = [xmin, xmax, ymin, ymax, zmin, zmax]"""
-    areas = 0
-    for block in blocks:
-        y = block[2:4]
-        z = block[4:6]
-        areas += area(y, z)
-    return areas
+    return np.sum(asblockarray(blocks).fronts)
 
 
 def length(interval):
@@ -38,7 +30,7 @@ def length(interval):
 
 def areas(xarray, yarray):
     """Calculates the areas of two given arrays"""
-    areas = [x * y for x, y in zip(xarray, yarray)]
+    areas = np.asarray(xarray) * np.asarray(yarray)
     return areas
 
 
@@ -47,54 +39,96 @@ def normed_sum(array, norm):
     return normsum
 
 
-def calculate_blockstats(blocks, a0=None):
+def blockstats_table(layouts, a0=None, percentiles=(10, 50, 90)):
+    """Calculates the block statistics of many layouts at once.
+    The blocks of all layouts are stored in one array and the statistics are
+    reduced per layout with bincount, so that there is no loop over layouts.
+    :param layouts: list of layouts or BlockBatch.
+    :param a0: domain area, one value or one value per layout.
+    :param percentiles: height percentiles, stored as heightp<q>.
+    :return: columnar table as dictionary of arrays with one row per layout.
+        Height statistics of layouts without blocks are nan."""
+    if not isinstance(layouts, BlockBatch):
+        layouts = BlockBatch.from_layouts(layouts)
+    blocks = BlockArray(layouts.data, ncols=6)
+    n = len(layouts)
+    counts = layouts.counts
+    layout = layouts.layout
+
+    heights = blocks.heights
+    plans = blocks.plans
+
+    def total(values):
+        return np.bincount(layout, weights=values, minlength=n)
+
+    def perlayout(values):
+        # nan for layouts without blocks
+        return np.where(counts > 0, values, np.nan)
+
+    # heights of each layout in ascending order
+    sortedheights = heights[np.lexsort((heights, layout))]
+    first = layouts.offsets[:-1]
+    last = np.maximum(layouts.offsets[1:] - 1, first)
+
+    def sortedvalue(position):
+        # linear interpolation between the sorted heights of each layout
+        out = np.full(n, np.nan)
+        nonempty = counts > 0
+        position = position[nonempty]
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, last[nonempty])
+        out[nonempty] = sortedheights[low] + (position - low) * (sortedheights[high] - sortedheights[low])
+        return out
+
+    table = {}
+    table['nblocks'] = counts
+    table['heightmax'] = sortedvalue(last.astype(float))
+    heightmean = perlayout(total(heights) / np.maximum(counts, 1))
+    table['heightmean'] = heightmean
+    deviations = heights - heightmean[layout]
+    table['heightstd'] = np.sqrt(perlayout(total(deviations**2) / np.maximum(counts, 1)))
+    planarea = total(plans)
+    table['heightweighted'] = perlayout(total(plans * heights) / np.where(planarea > 0, planarea, 1))
+    for q in percentiles:
+        table['heightp%g' % q] = sortedvalue(first + q / 100 * (last - first))
+
+    table['planarea'] = planarea
+    table['frontarea'] = total(blocks.fronts)
+    table['sidearea'] = total(blocks.sides)
+
+    if a0 is not None:
+        # building area density
+        table['planindex'] = table['planarea'] / a0
+        # frontal aspect ratios for wind from x and y direction
+        table['frontindex'] = table['frontarea'] / a0
+        table['sideindex'] = table['sidearea'] / a0
+
+    return table
+
+
+def calculate_blockstats(blocks, a0=None, percentiles=(10, 50, 90)):
+    """Calculates the statistics of one layout, the row of the layout in
+    blockstats_table and the lengths and areas of all blocks."""
     precision=4
-    
-    # number of blocks
-    nblocks = len(blocks)
-
-    # block length in z
-    blockheights = [length(b[4:6]) for b in blocks]
-    # block length in y
-    blockwidths = [length(b[2:4]) for b in blocks]
-    # block length in x
-    blocklengths = [length(b[0:2]) for b in blocks]
-
-    # block maximum height
-    heightmax = np.max(blockheights)
-    # block mean height
-    heightmean = np.mean(blockheights)
-    # block height standard deviation
-    heightstd = np.std(blockheights)
-
-    # block plan areas
-    blockplans = areas(blocklengths, blockwidths)
-    # block frontal areas for wind from x direction
-    blockfronts = areas(blockwidths, blockheights)
-    # block frontal areas for wind from y direction
-    # blocksides = areas(blocklengths, blockheights)
+    blocks = asblockarray(blocks)
+    table = blockstats_table([blocks], a0=a0, percentiles=percentiles)
     
     # add statistics to dictionary
     blockstats = {}
-    blockstats['nblocks'] = nblocks
-    blockstats['blockheights'] = blockheights
-    blockstats['blockwidths'] = blockwidths
-    blockstats['blocklengths'] = blocklengths
-    blockstats['heightmax'] = heightmax
-    blockstats['heightmean'] = heightmean
-    blockstats['heightstd'] = heightstd
-    blockstats['blockplans'] = blockplans
-    blockstats['blockfronts'] = blockfronts
-    # blockstats['blocksides'] = blocksides
-    
-    if a0 is not None:
-        # building area density
-        planindex = normed_sum(blockplans, a0)
-        # building frontal aspect ratio
-        frontindex = normed_sum(blockfronts, a0)
-        # add statistics to dictionary
-        blockstats['planindex'] = planindex
-        blockstats['frontindex'] = frontindex        
+    blockstats['nblocks'] = len(blocks)
+    # block length in z, y and x
+    blockstats['blockheights'] = blocks.heights
+    blockstats['blockwidths'] = blocks.widths
+    blockstats['blocklengths'] = blocks.lengths
+    # block plan areas and frontal areas for wind from x and y direction
+    blockstats['blockplans'] = blocks.plans
+    blockstats['blockfronts'] = blocks.fronts
+    blockstats['blocksides'] = blocks.sides
+    # height statistics and percentiles, total areas and, with a0,
+    # building area density and frontal aspect ratios
+    for key, values in table.items():
+        if key != 'nblocks':
+            blockstats[key] = values[0]
     
     for key, val in blockstats.items():
         # convert numpy types to generic python types
@@ -107,53 +141,74 @@ def calculate_blockstats(blocks, a0=None):
     return blockstats
 
 
+def blockshifts(blocks, limits, shifts):
+    """Shifts a layout periodically by many (xshift, yshift) pairs at once.
+    Blocks are moved to (x - xshift) % xmax and (y - yshift) % ymax. A block that
+    crosses a boundary is split into a part up to the upper and a part from the
+    lower limit, first in x and then in y, such that a block that crosses both
+    boundaries is split into four blocks.
+    :param limits: domain limits [xmin, xmax, ymin, ymax, ...].
+    :param shifts: array of shape (S, 2) of shifts in x and y.
+    :return: the S shifted layouts as BlockBatch."""
+    blocks = asblockarray(blocks)
+    shifts = np.asarray(shifts, dtype=float).reshape(-1, 2)
+    xmin, xmax, ymin, ymax = limits[0:4]
+
+    # shifted coordinates of all blocks for all shifts, shape (S, N, 2)
+    x = (blocks.data[None, :, 0:2] - shifts[:, None, 0:1]) % xmax
+    y = (blocks.data[None, :, 2:4] - shifts[:, None, 1:2]) % ymax
+    xwrap = (x[..., 1] <= x[..., 0]).ravel()
+    ywrap = (y[..., 1] <= y[..., 0]).ravel()
+    x = x.reshape(-1, 2)
+    y = y.reshape(-1, 2)
+
+    # each block is split into (1 + xwrap) * (1 + ywrap) parts, in the order
+    # of the x parts and then the y parts of each x part
+    counts = (1 + xwrap) * (1 + ywrap)
+    index = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    part = np.arange(len(index)) - starts[index]
+    xpart = part // (1 + ywrap[index])
+    ypart = part % (1 + ywrap[index])
+
+    data = np.repeat(np.tile(blocks.data, (len(shifts), 1)), counts, axis=0)
+    data[:, 0:2] = x[index]
+    data[:, 2:4] = y[index]
+    xsplit = xwrap[index]
+    ysplit = ywrap[index]
+    data[xsplit & (xpart == 0), 1] = xmax
+    data[xsplit & (xpart == 1), 0] = xmin
+    data[ysplit & (ypart == 0), 3] = ymax
+    data[ysplit & (ypart == 1), 2] = ymin
+
+    nblocks = counts.reshape(len(shifts), len(blocks)).sum(axis=1)
+    offsets = np.concatenate([[0], np.cumsum(nblocks)])
+
+    return BlockBatch(data, offsets, ncols=blocks.ncols)
+
+
 def blockshift(blocks, limits, xshift, yshift):
-    # shift the whole block layout
-    
-    xmin = limits[0]
-    xmax = limits[1]
-    ymin = limits[2]
-    ymax = limits[3]
-
-    shiftblocks = []
-    for block in blocks:
-        newx = [(b - xshift) % xmax for b in block[0:2]]
-        newy = [(a - yshift) % ymax for a in block[2:4]]
-        z = block[4:6]
-        shiftblocks.append(newx + newy + z)
-
-    # split up blocks that go over boundaries
-    tmpblocks = []
-    for block in shiftblocks:
-        # if imax < imin
-        if block[1] <= block[0]:
-            # create new block coordinates
-            x1 = [block[0], xmax]
-            x2 = [xmin, block[1]]
-            y = block[2:4]
-            z = block[4:6]
-            newblock1 = x1 + y + z
-            newblock2 = x2 + y + z
-            tmpblocks.extend([newblock1, newblock2])
-        else:
-            tmpblocks.extend([block])
-
-    newblocks = []
-    for block in tmpblocks:
-        # if jmax < jmin
-        if block[3] <= block[2]:
-            # create new block coordinates
-            x = block[0:2]
-            y1 = [block[2], ymax]
-            y2 = [ymin, block[3]]
-            z = block[4:6]
-            newblock3 = x + y1 + z
-            newblock4 = x + y2 + z
-            newblocks.extend([newblock3, newblock4])
-        else:
-            newblocks.extend([block])
-
-    return newblocks
+    """Shifts the whole block layout periodically, see blockshifts."""
+    return blockshifts(blocks, limits, [[xshift, yshift]])[0]
+
+
+def blocktile(blocks, limits, m, n):
+    """Repeats a periodic layout m times in x and n times in y.
+    The copies are shifted by multiples of the domain lengths xmax - xmin and
+    ymax - ymin and are stored tile by tile, with x varying fastest.
+    :param limits: domain limits [xmin, xmax, ymin, ymax, ...].
+    :return: tiled layout as BlockArray."""
+    blocks = asblockarray(blocks)
+    lx = limits[1] - limits[0]
+    ly = limits[3] - limits[2]
+
+    j, i = np.divmod(np.arange(m * n), m)
+    offsets = np.zeros((m * n, 1, 6))
+    offsets[:, 0, 0:2] = (i * lx)[:, None]
+    offsets[:, 0, 2:4] = (j * ly)[:, None]
+    tiles = blocks.data[None] + offsets
+
+    return BlockArray(tiles.reshape(-1, 6)[:, :blocks.ncols])
 
 
 def convert(blocks, dx, dy, dz, rounding=True):
@@ -162,31 +217,13 @@ def convert(blocks, dx, dy, dz, rounding=True):
     Block entries stored as block = [xmin, xmax, ymin, ymax, zmin, zmax]"""
 
     resolution = np.array([dx, dx, dy, dy, dz, dz])
-    newblocks = blocks * resolution
-    newblocks = newblocks.tolist()
+    newblocks = np.asarray(asblockarray(blocks)) * resolution
     if rounding is True:  # rounds new blocks to integers!
-        newblocks = [[round(x) for x in block] for block in newblocks]
+        newblocks = np.round(newblocks)
 
-    return newblocks
+    return BlockArray(newblocks)
 
 
 def write(blocks, filename):
-
-    for block in blocks:
-        # Checks that blocks are the right length. 
-        # If you have only one block, store as blocks = [[block]].
-        if len(block) == 6:
-            pass
-        else:
-            raise IndexError("Blocks not the right length.")
-
-    file = open(filename, 'w')
-    file.write("{:12}".format('# Block location') + '\n')
-    file.write("{:100}".format('#  il  iu  jl  ju  kl  ku') + '\n')
-
-    for block in blocks:
-        for val in block[0:6]:
-            file.write('{:<3.0f} '.format(val))
-        file.write('\n')
-
-    file.close()
+    """Writes blocks in grid indices to a text file, see blockfiles.write_text."""
+    blockfiles.write_text(blocks, filename)
@@ -1,9 +1,19 @@
 import os
 import datetime
 import time
-import IPython
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib import animation
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 from . import plot
+from .blocks import BlockArray, asblockarray
+from .history import History
 
 # SUPPORT FUNCTIONS FOR VIDEOS
 # ------------------------------------------
@@ -19,53 +29,196 @@ def save_path(path):
     if not os.path.exists(savehere):
         os.mkdir(savehere)
     return savehere
-        
-        
+
+
 def save_image(path, i, **save_kwargs):
-    plt.savefig("%s-%03d" % (path, int(i)), 
+    plt.savefig("%s-%03d" % (path, int(i)),
                 **save_kwargs)
     return
 
 
-def show_video(fig):
+def show_video(fig, pause=0.1):
+    # IPython is only needed to show videos in notebooks
+    import IPython
     IPython.display.display(fig)
     IPython.display.clear_output(wait=True)
-    time.sleep(0.1)
+    time.sleep(pause)
     return
 
 
+def get_limits(blocks, greenery=()):
+    """Returns plot limits [xmin, xmax, ymin, ymax, zmin, zmax] that contain a layout."""
+    blocks = BlockArray(blocks, ncols=6)
+    blocks.extend(BlockArray(greenery, ncols=6))
+    if len(blocks) == 0:
+        return [0, 1, 0, 1, 0, 1]
+    zmax = max(np.amax(blocks.zmax), 1)
+    return [0, np.amax(blocks.xmax), 0, np.amax(blocks.ymax), 0, 3*zmax]
+
+
+def get_frames(blockgeneration, start=0, stop=None):
+    """Returns an iterator over the layouts of steps start to stop.
+    Layouts of a History are reconstructed while iterating."""
+    if isinstance(blockgeneration, History):
+        return blockgeneration.snapshots(start, stop)
+    return itertools.islice(blockgeneration, start, stop)
+
+
+def get_writer(path, writer=None, fps=10):
+    """Returns a matplotlib animation writer.
+    :param writer: writer instance or name of a registered writer. Default is
+        'pillow' for paths ending in .gif and 'ffmpeg' otherwise."""
+    if writer is None:
+        writer = 'pillow' if path.lower().endswith('.gif') else 'ffmpeg'
+    if isinstance(writer, str):
+        writer = animation.writers[writer](fps=fps)
+    return writer
+
+
+class LayoutRenderer:
+    """Draws the steps of a layout generation into one figure.
+    2D layouts are drawn as one PolyCollection on a 2D axis and 3D layouts as one
+    Poly3DCollection on a 3D axis on top of it. The axes and collections are created
+    once, drawing a step only replaces the vertices of one collection and switches
+    the visible axis when the layouts change from 2D to 3D.
+    :param fig: matplotlib figure.
+    :param limits: plot limits [xmin, xmax, ymin, ymax, zmin, zmax].
+    :param greenery: green blocks that are shown with all 3D layouts.
+    :param ax: 2D axis to draw on, default is a new subplot.
+    :param kwargs: keyword arguments of the block collections, e.g. facecolor."""
+
+    def __init__(self, fig, limits, greenery=(), ax=None, **kwargs):
+        self.fig = fig
+        self.ax2d = ax if ax is not None else fig.add_subplot(1, 1, 1)
+        self.ax3d = fig.add_axes(self.ax2d.get_position(), projection='3d')
+        plot.plot_2dlayout(BlockArray(ncols=4), ax=self.ax2d, limits=limits[:4])
+        plot.plot_3dlayout(BlockArray(ncols=6), ax=self.ax3d, limits=limits)
+
+        self.footprints = PolyCollection([], **kwargs)
+        self.ax2d.add_collection(self.footprints)
+        self.solids = Poly3DCollection([], **kwargs)
+        self.ax3d.add_collection3d(self.solids)
+        green = plot.polygons(greenery)
+        self.ax3d.add_collection3d(Poly3DCollection(green, facecolor='g'))
+
+        self.ncols = None
+        self.ax3d.set_visible(False)
+
+    def draw(self, blocks):
+        """Updates the figure to show a layout."""
+        blocks = asblockarray(blocks)
+        if blocks.ncols == 4:
+            self.footprints.set_verts(plot.footprints(blocks))
+        else:
+            self.solids.set_verts(plot.polygons(blocks))
+
+        if blocks.ncols != self.ncols:
+            self.ax2d.set_visible(blocks.ncols == 4)
+            self.ax3d.set_visible(blocks.ncols == 6)
+            self.ncols = blocks.ncols
+        return
+
+
+def _render_frames(frames, start, stop, limits, greenery, figsize, dpi, kwargs):
+    # worker: render steps start to stop without pyplot and return them as RGB images
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    renderer = LayoutRenderer(fig, limits, greenery, **kwargs)
+    images = []
+    for blocks in get_frames(frames, start, stop):
+        renderer.draw(blocks)
+        canvas.draw()
+        images.append(np.asarray(canvas.buffer_rgba())[..., :3].copy())
+    return np.array(images)
+
+
 # -----------
 # MAIN VIDEO FUNCTIONS
 
-def video_layout(blockgeneration, greenery=[], fig=None, ax=None, limits=None, show=True, save=False, path="./", **kwargs):
+def video_layout(blockgeneration, greenery=[], fig=None, ax=None, limits=None, show=True, save=False, path="./", pause=0.1, **kwargs):
+    # blockgeneration is a list of layouts or a history.History,
+    # whose layouts are reconstructed step by step while plotting
 
     if fig is None:
         fig = plt.figure()
-    if ax is None:
-        ax = fig.add_subplot(1, 1, 1)
+    if limits is None:
+        blockgeneration = blockgeneration if isinstance(blockgeneration, History) else list(blockgeneration)
+        limits = get_limits(blockgeneration[-1], greenery)
+    renderer = LayoutRenderer(fig, limits, greenery, ax=ax, **kwargs)
 
     # create directory to save plots
     if save is True:
         savehere = save_path(path)
 
-    for i, blocks in enumerate(blockgeneration):
-
-        if len(blocks[0]) == 4:  # a block in itblocks is 2D
-            ax.clear()  # clear data from axis
-            plot.plot_2dlayout(blocks, ax=ax, limits=limits[:4], **kwargs)
-
-        elif len(blocks[0]) == 6:  # a block in itblocks is 3D
-            plt.clf()  # clear plot data
-            ax = fig.add_subplot(1, 1, 1, projection='3d')
-            plot.plot_3dlayout(blocks, ax=ax, limits=limits, **kwargs)
-            plot.plot_3dlayout(greenery, ax=ax, facecolor='g', limits=limits)
-            ax.dist=11
+    for i, blocks in enumerate(get_frames(blockgeneration)):
+        renderer.draw(blocks)
 
         if save is True:
-            save_image(savehere + "ULG", i)  
+            save_image(savehere + "ULG", i)
         if show is True:
-            show_video(fig)
+            show_video(fig, pause)
 
     plt.show()
 
     return
+
+
+def animate_layout(blockgeneration, path, greenery=(), limits=None, fps=10, dpi=100, figsize=(6.4, 4.8),
+                   writer=None, workers=1, chunksize=50, **kwargs):
+    """Encodes the steps of a layout generation into an animation file without a display.
+    Frames are drawn with a LayoutRenderer and passed to a matplotlib animation writer.
+    :param blockgeneration: History or list of layouts.
+    :param path: output file, e.g. generation.gif or generation.mp4.
+    Optional:
+    :param greenery: green blocks that are shown with all 3D layouts.
+    :param limits: plot limits, default contains the last layout.
+    :param fps: frames per second.
+    :param dpi, figsize: resolution and size of the frames.
+    :param writer: writer instance or name of a registered matplotlib writer.
+        Default is 'pillow' for GIF files and 'ffmpeg' otherwise.
+    :param workers: number of worker processes that render ranges of chunksize frames.
+        The main process encodes the frames in order while the workers render.
+    :param kwargs: keyword arguments of the block collections, e.g. facecolor."""
+
+    if not isinstance(blockgeneration, History):
+        blockgeneration = list(blockgeneration)
+    if limits is None:
+        limits = get_limits(blockgeneration[-1], greenery)
+    greenery = BlockArray(greenery, ncols=6)
+    writer = get_writer(path, writer, fps)
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+
+    if workers == 1:
+        renderer = LayoutRenderer(fig, limits, greenery, **kwargs)
+        with writer.saving(fig, path, dpi):
+            for blocks in get_frames(blockgeneration):
+                renderer.draw(blocks)
+                writer.grab_frame()
+        return
+
+    # the frames of the workers are shown as image that fills the figure
+    n = len(blockgeneration)
+    image = fig.figimage(np.zeros((1, 1, 3), dtype=np.uint8))
+    ranges = iter([(start, min(start + chunksize, n)) for start in range(0, n, chunksize)])
+
+    def submit(pool, start, stop):
+        # workers get the history, or only the layouts of their range
+        frames = blockgeneration if isinstance(blockgeneration, History) else blockgeneration[start:stop]
+        offset = 0 if isinstance(blockgeneration, History) else start
+        return pool.submit(_render_frames, frames, start - offset, stop - offset,
+                           limits, greenery, figsize, dpi, kwargs)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, writer.saving(fig, path, dpi):
+        # keep at most two ranges per worker in flight to bound the memory of frames
+        pending = deque(submit(pool, *r) for r in itertools.islice(ranges, 2 * workers))
+        while pending:
+            images = pending.popleft().result()
+            for r in itertools.islice(ranges, 1):
+                pending.append(submit(pool, *r))
+            for frame in images:
+                image.set_data(frame)
+                writer.grab_frame()
+
+    return
@@ -0,0 +1,65 @@
+import numpy as np
+from .blocks import BlockArray
+from .raster import cell_ranges, paint
+
+
+# Blocks are put onto the LES grid of imax x jtot x kmax cells with spacings dx, dy, dz,
+# e.g. dx = xsize/imax as in generate_layout. A cell is solid if its centre lies inside
+# a block. All fields are painted with raster.paint, as the pixels of plot.rasterize.
+
+
+def columns(blocks, imax, jtot, kmax, dx, dy, dz):
+    """Returns the solid cells of each grid column, as every column crosses at most one block.
+    :return: kbottom and ktop of shape (imax, jtot), cells kbottom <= k < ktop are solid."""
+    blocks = BlockArray(blocks, ncols=6)
+    k0, k1 = cell_ranges(blocks.zmin, blocks.zmax, dz, kmax)
+    kbottom = paint(blocks, k0, imax, jtot, dx, dy)
+    ktop = paint(blocks, k1, imax, jtot, dx, dy)
+
+    return kbottom, ktop
+
+
+def heightmap(blocks, imax, jtot, dx, dy, dz=None):
+    """Returns the block tops on the grid as array of shape (imax, jtot).
+    :param dz: if given, heights are in number of cells, otherwise in metres."""
+    blocks = BlockArray(blocks, ncols=6)
+    if dz is None:
+        return paint(blocks, blocks.zmax, imax, jtot, dx, dy)
+    kmax = int(np.ceil(np.amax(blocks.zmax, initial=0) / dz)) + 1
+    _, ktop = columns(blocks, imax, jtot, kmax, dx, dy, dz)
+
+    return ktop
+
+
+def solidmask(blocks, imax, jtot, kmax, dx, dy, dz, dtype=bool, out=None, chunksize=64):
+    """Returns the solid cells on the grid as array of shape (imax, jtot, kmax).
+    The mask is filled in slabs of chunksize x-rows, so only one slab is held in
+    memory at a time besides the output.
+    :param dtype: data type of the mask, e.g. bool or np.int8.
+    :param out: output array, or name of a .npy file that is created as memory map,
+        such that large domains do not need to fit into memory. Default is a new array."""
+    kbottom, ktop = columns(blocks, imax, jtot, kmax, dx, dy, dz)
+    shape = (imax, jtot, kmax)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+
+    k = np.arange(kmax)
+    for i in range(0, imax, chunksize):
+        rows = slice(i, i + chunksize)
+        out[rows] = (k >= kbottom[rows, :, None]) & (k < ktop[rows, :, None])
+    if isinstance(out, np.memmap):
+        out.flush()
+
+    return out
+
+
+def runlengths(blocks, imax, jtot, kmax, dx, dy, dz):
+    """Returns the solid cells on the grid as one run of cells per solid column,
+    a sparse form of the solid mask whose size does not depend on kmax.
+    :return: arrays i, j, kbottom, ktop of all columns with solid cells."""
+    kbottom, ktop = columns(blocks, imax, jtot, kmax, dx, dy, dz)
+    i, j = np.nonzero(ktop > kbottom)
+
+    return i, j, kbottom[i, j], ktop[i, j]
@@ -0,0 +1,17 @@
+import numpy as np
+from citygenerator import checks
+
+
+def test_gap_pairs_across_periodic_boundary():
+    blocks = np.array([[0.5, 10, 0, 10],     # 0.7 from block 1 across x = 100
+                       [90, 99.8, 0, 10],
+                       [40, 50, 40, 50],
+                       [20, 30, 95, 100],    # one block split at y = 100
+                       [20, 30, 0, 3]])
+    limits = [0, 100, 0, 100, 0, 100]
+    assert len(checks.gap_pairs(blocks, 1, 1)) == 0
+    assert checks.gap_pairs(blocks, 1, 1, limits).tolist() == [[0, 1]]
+
+    report = checks.validate(blocks, limits, [1, 1, 1], heightratio=0, blockvolume=0)
+    assert report['gap'].tolist() == [True, True, False, False, False]
+    assert checks.validate(blocks, limits, [1, 1, 1], heightratio=0, blockvolume=0, periodic=False)['valid']
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from citygenerator import fractal, checks
+
+
+@pytest.mark.parametrize("arrangement", ["aligned", "staggered"])
+@pytest.mark.parametrize("xsize, ysize, lp, lf, nx, ny, heights", [
+    (100, 100, 0.25, 0.2, 4, 4, None),
+    (100, 100, 0.25, 0.2, 4, 4, [[1, 2], [2, 1]]),
+    (300, 200, 0.3, 0.15, 7, 5, None),
+    (96, 96, 0.16, 0.3, 3, 3, None),
+])
+def test_generate_array_frontal_area(arrangement, xsize, ysize, lp, lf, nx, ny, heights):
+    # blocks split at the periodic boundary count both fronts
+    blocks = fractal.generate_array(xsize, ysize, lp, lf, nx, ny, arrangement, heights)
+    a0 = xsize * ysize
+    # heights are rounded to whole metres, at most half a metre per block
+    assert abs(np.sum(blocks.fronts) - lf * a0) <= np.sum(blocks.widths) / 2
+
+
+@pytest.mark.parametrize("arrangement", ["aligned", "staggered"])
+@pytest.mark.parametrize("xsize, ysize, lp, nx, ny", [
+    (100, 100, 0.25, 4, 4),
+    (300, 200, 0.3, 7, 5),
+    (60, 60, 0.5, 2, 4),
+])
+def test_generate_array_pitch(arrangement, xsize, ysize, lp, nx, ny):
+    # rows and the blocks of unshifted rows are one cell apart
+    blocks = fractal.generate_array(xsize, ysize, lp, 0.2, nx, ny, arrangement)
+    rows = np.unique(blocks.ymin)
+    assert np.allclose(np.diff(rows), ysize / ny)
+    first = blocks.xmin[blocks.ymin == rows[0]]
+    assert np.allclose(np.diff(np.sort(first)), xsize / nx)
+
+
+@pytest.mark.parametrize("arrangement", ["aligned", "staggered"])
+@pytest.mark.parametrize("xsize, ysize, lp, nx, ny", [
+    (100, 100, 0.25, 4, 4),
+    (60, 60, 0.5, 2, 4),
+    (60, 60, 0.81, 2, 4),
+])
+def test_generate_array_no_empty_blocks(arrangement, xsize, ysize, lp, nx, ny):
+    # blocks lie inside the domain and only the x axis is wrapped by the stagger
+    blocks = fractal.generate_array(xsize, ysize, lp, 0.2, nx, ny, arrangement)
+    assert not np.any(checks.bounds_mask(blocks, [0, xsize, 0, ysize]))
+    assert np.isclose(np.sum(blocks.plans), nx * ny * blocks.plans[0])
+
+
+@pytest.mark.parametrize("arrangement", ["aligned", "staggered"])
+@pytest.mark.parametrize("xsize, ysize, lp, nx, ny", [
+    (100, 100, 0.25, 4, 4),
+    (300, 200, 0.3, 7, 5),
+    (60, 60, 0.81, 2, 4),
+    (60, 60, 0.95, 2, 4),
+    (100, 100, 1., 4, 4),
+])
+def test_generate_array_streets(arrangement, xsize, ysize, lp, nx, ny):
+    # blocks neither overlap nor touch
+    blocks = fractal.generate_array(xsize, ysize, lp, 0.2, nx, ny, arrangement)
+    report = checks.validate(blocks, [0, xsize, 0, ysize, 0, 300], [1, 1, 1], blockvolume=0)
+    assert len(report['overlaps']) == 0
+    assert len(report['gaps']) == 0
@@ -0,0 +1,30 @@
+import itertools
+import numpy as np
+from citygenerator import greenery
+
+
+def smallest_set(areas, low, high, kmax):
+    for k in range(1, kmax + 1):
+        if any(low <= sum(c) <= high for c in itertools.combinations(areas, k)):
+            return k
+    return None
+
+
+def test_select_greenery_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        areas = rng.integers(1, 60, rng.integers(4, 11)).astype(float)
+        target = float(rng.integers(1, 250))
+        selection = greenery.select_greenery(areas, target, 0.01, kmax=6)
+        k = smallest_set(areas, 0.99 * target, 1.01 * target, 6)
+        assert selection['found'] == (k is not None)
+        if k is not None:
+            assert selection['nblocks'] == k == len(np.unique(selection['indices']))
+            assert 0.99 * target <= selection['area'] <= 1.01 * target
+
+
+def test_select_greenery_more_than_three_blocks():
+    areas = np.full(3000, 100.)
+    selection = greenery.select_greenery(areas, 2000, tolerance=0.001, kmax=30)
+    assert selection['found'] and selection['nblocks'] == 20
+    assert not greenery.select_greenery(areas, 2050, tolerance=0.001, kmax=30)['found']
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from citygenerator import heights
+from citygenerator.blocks import BlockArray
+
+
+def random_footprints(n, seed):
+    rng = np.random.default_rng(seed)
+    x0 = rng.integers(0, 500, n) * 1.
+    y0 = rng.integers(0, 500, n) * 1.
+    return BlockArray(np.stack([x0, x0 + rng.integers(5, 40, n), y0, y0 + rng.integers(5, 40, n)], axis=1))
+
+
+@pytest.mark.parametrize("delta", [1.5, 0.7, 3.3])
+@pytest.mark.parametrize("fraction", [0.05, 0.5, 0.95])
+@pytest.mark.parametrize("randomness", [0., 0.5, 1.])
+def test_solve_heights_within_half_increment(delta, fraction, randomness):
+    # delta does not divide maxheight, the heights are capped below maxheight
+    blocks = random_footprints(40, seed=1)
+    maxheight = 50
+    lowest = heights.minimum_heights(blocks, randomness, 10)
+    highest = lowest + np.floor((maxheight - lowest) / delta) * delta
+    low, high = np.sum(blocks.widths * lowest), np.sum(blocks.widths * highest)
+    target = low + fraction * (high - low)
+
+    blocks3d = heights.solve_heights(blocks, target, randomness, maxheight, 10, delta, seed=2)
+
+    assert np.all(blocks3d.heights <= maxheight)
+    assert np.allclose(np.round((blocks3d.heights - lowest) / delta), (blocks3d.heights - lowest) / delta)
+    assert abs(np.sum(blocks3d.fronts) - target) <= np.amax(blocks.widths) * delta / 2 + 1e-9
@@ -0,0 +1,11 @@
+import numpy as np
+from citygenerator import fractal, plot, voxels
+
+
+def test_rasterize_matches_voxel_heightmap():
+    # a thumbnail pixel and a voxel column of the same cell have the same height
+    blocks = fractal.generate_array(100, 100, 0.3, 0.2, 7, 5, "staggered", [[1, 2], [3, 1]])
+    for spacing in [1., 0.7, 2.5]:
+        n = int(np.ceil(100 / spacing))
+        heightmap = voxels.heightmap(blocks, n, n, spacing, spacing)
+        assert np.array_equal(plot.rasterize(blocks, spacing, [0, 100, 0, 100]), heightmap.T)
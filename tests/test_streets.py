@@ -0,0 +1,21 @@
+import numpy as np
+from citygenerator import fractal
+from citygenerator.streets import StreetNetwork
+
+
+def test_canyon_ratio_of_periodic_main_street():
+    # the main street along y is narrower than twice the margin and crosses x = 0
+    streets = StreetNetwork()
+    blocks, _, _ = fractal.generate_layout(xsize=300, ysize=300, zsize=300, imax=300, jtot=300, kmax=300,
+                                           pbuild=0.4, pgreen=0., pfrontal=0.2, order="random",
+                                           layoutrandom=0.6, heightrandom=0.4, margin=5, minwidth=8,
+                                           minvolume=10, seed=3, streets=streets)
+    main, image = streets.streets[0], streets.streets[1]
+    assert image['image'] and image['position'] - image['width'] / 2 < 0 < image['position'] + image['width'] / 2
+
+    # blocks on both sides of the boundary, left of the main street and right of its image
+    along = (streets.blockstreets[:, 1] == 0) | (streets.blockstreets[:, 0] == 1)
+    assert np.any(streets.blockstreets[:, 1] == 0) and np.any(streets.blockstreets[:, 0] == 1)
+    ratios = streets.canyon_ratios(blocks)
+    assert np.isclose(ratios[0], np.mean(blocks.heights[along]) / main['width'])
+    assert ratios[0] == ratios[1]
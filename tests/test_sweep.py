@@ -0,0 +1,17 @@
+from citygenerator import sweep
+
+
+PARAMS = dict(xsize=200, ysize=200, zsize=200, imax=200, jtot=200, kmax=200, pbuild=0.4,
+              pfrontal=0.2, order="random", layoutrandom=0.6, heightrandom=0.4,
+              margin=5, minwidth=8, minvolume=10)
+
+
+def test_run_sweep_resumes_only_the_same_sweep(tmp_path):
+    grid = {'pgreen': [0.05, 0.1]}
+    assert len(sweep.run_sweep(grid, PARAMS, 2, str(tmp_path), workers=1, seed=0)) == 4
+    # the same sweep is complete, other seeds and parameters are new realisations
+    assert len(sweep.run_sweep(grid, PARAMS, 2, str(tmp_path), workers=1, seed=0)) == 4
+    assert len(sweep.run_sweep(grid, PARAMS, 2, str(tmp_path), workers=1, seed=1)) == 8
+    store = sweep.run_sweep(grid, dict(PARAMS, pbuild=0.3), 2, str(tmp_path), workers=1, seed=1)
+    assert len(store) == 12
+    assert len(set(record['sweep'] for record in store.records())) == 3
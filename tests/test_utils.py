@@ -0,0 +1,10 @@
+import numpy as np
+from citygenerator import fractal, utils
+
+
+def test_calculate_blockstats_matches_table():
+    blocks = fractal.generate_array(100, 100, 0.25, 0.2, 4, 4, "staggered", [[1, 2], [2, 1]])
+    table = utils.blockstats_table([blocks], a0=100 * 100, percentiles=(25, 75))
+    blockstats = utils.calculate_blockstats(blocks, a0=100 * 100, percentiles=(25, 75))
+    for key, values in table.items():
+        assert np.isclose(blockstats[key], values[0], atol=1e-4)